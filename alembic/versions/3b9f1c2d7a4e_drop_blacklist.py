@@ -0,0 +1,77 @@
+"""Drop blacklist, revoked tokens live in redis
+
+Unexpired blacklisted tokens are copied to the redis revocation keys with
+their remaining lifetime and published to the running workers' Bloom
+filters before the table is dropped. The upgrade fails, and keeps the
+table, when redis is unreachable.
+
+Revision ID: 3b9f1c2d7a4e
+Revises: 668e9221f3e4
+Create Date: 2026-10-18 13:05:12.417203
+
+"""
+import time
+
+import jwt
+import redis
+from alembic import context, op
+import sqlalchemy as sa
+
+from services.revocation import CHANNEL, PREFIX, fingerprint
+from settings import Settings
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9f1c2d7a4e'
+down_revision = '668e9221f3e4'
+branch_labels = None
+depends_on = None
+
+
+def copy_revocations(connection, client, secret, algorithm) -> int:
+    """
+    Revoke every unexpired blacklisted token in redis the way logout does,
+    return the number of copied tokens
+    """
+    now = time.time()
+    pipe = client.pipeline(transaction=False)
+    copied = 0
+    for (token,) in connection.execute(sa.text("SELECT token FROM blacklist")):
+        try:
+            expires = jwt.decode(token, secret, algorithms=[algorithm])["expires"]
+        except (jwt.InvalidTokenError, KeyError):
+            continue
+        ttl = int(expires - now) + 1
+        if ttl <= 0:
+            continue
+        key = fingerprint(token)
+        pipe.set(f"{PREFIX}{key}", 1, ex=ttl)
+        pipe.publish(CHANNEL, key)
+        copied += 1
+    pipe.execute()
+    return copied
+
+
+def upgrade():
+    # --sql runs have no rows to copy, revocations must then be moved by hand
+    if not context.is_offline_mode():
+        settings = Settings()
+        client = redis.Redis.from_url(settings.REDIS_URL)
+        try:
+            copy_revocations(
+                op.get_bind(), client, settings.SECRET, settings.ALGORITHM
+            )
+        finally:
+            client.close()
+    op.drop_index(op.f('ix_blacklist_id'), table_name='blacklist')
+    op.drop_table('blacklist')
+
+
+def downgrade():
+    op.create_table('blacklist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('token')
+    )
+    op.create_index(op.f('ix_blacklist_id'), 'blacklist', ['id'], unique=False)
@@ -0,0 +1,24 @@
+"""Index items by user_id and id for keyset pagination
+
+Revision ID: 8c2e5a1f4d6b
+Revises: 3b9f1c2d7a4e
+Create Date: 2026-10-18 14:02:37.915480
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2e5a1f4d6b'
+down_revision = '3b9f1c2d7a4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_items_user_id_id', 'items', ['user_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_items_user_id_id', table_name='items')
@@ -1,14 +1,31 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from services import metrics
+from services.runtime import LoopLocal
 from settings import Settings
 
 settings = Settings()
 
 SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.DATABASE}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{settings.DATABASE}"
+
+POOL_OPTIONS = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+}
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
+event.listen(engine, "before_cursor_execute", metrics.before_query)
+event.listen(engine, "after_cursor_execute", metrics.after_query)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -20,3 +37,58 @@ def get_db():
         yield db 
     finally:
         db.close()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    metrics.DB_POOL_EVENTS.labels("connect").inc()
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    metrics.DB_POOL_EVENTS.labels("checkout").inc()
+    metrics.DB_POOL_CHECKED_OUT.inc()
+    connection_record.info["checkout_at"] = time.perf_counter()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    checkout_at = connection_record.info.pop("checkout_at", None)
+    if checkout_at is not None:
+        metrics.DB_POOL_CHECKED_OUT.dec()
+        metrics.DB_POOL_HELD_SECONDS.observe(time.perf_counter() - checkout_at)
+
+
+def _build_async_engine():
+    new_engine = create_async_engine(ASYNC_DATABASE_URL, **POOL_OPTIONS)
+    for name, listener in (
+        ("connect", _on_connect),
+        ("checkout", _on_checkout),
+        ("checkin", _on_checkin),
+        ("before_cursor_execute", metrics.before_query),
+        ("after_cursor_execute", metrics.after_query),
+    ):
+        event.listen(new_engine.sync_engine, name, listener)
+    return new_engine
+
+
+# asyncpg connections are bound to the loop that opened them
+async_engine = LoopLocal(_build_async_engine)
+
+
+async def get_async_db():
+    """
+    Async session, connections are taken from the pool on first query
+    """
+    db = AsyncSession(async_engine.get(), expire_on_commit=False)
+    try:
+        yield db
+    except TimeoutError:
+        metrics.DB_POOL_EVENTS.labels("timeout").inc()
+        raise
+    finally:
+        await db.close()
+
+
+async def close_async_engine():
+    current = async_engine.reset()
+    if current is not None:
+        await current.dispose()
+
@@ -0,0 +1,18 @@
+import os
+import shutil
+
+# Workers write metrics to files here, /metrics merges them.
+# Set before prometheus_client is imported anywhere, it picks the mode on import
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/weather_metrics")
+
+
+def on_starting(server):
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
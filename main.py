@@ -1,25 +1,128 @@
-from fastapi import FastAPI
+import time
+
+STARTED = time.perf_counter()
+
+import asyncio
+import logging
+import resource
+import sys
+
+from fastapi import FastAPI, Response
+
+import db
 
-from routers.weather import router as router_weather
 from routers.users import router as router_users
 from routers.api import router as router_api
+from services import (
+    compression,
+    gazetteer,
+    metrics,
+    passwords,
+    render,
+    revocation,
+    store,
+    upstream,
+)
+from settings import Settings
 
-app = FastAPI()
+settings = Settings()
 
-app.include_router(
-    router_weather,
-    prefix="/weather",
-    tags=["weather"]
-)
+# Modules only the chart endpoints need, loaded lazily by the render pool
+HEAVY_MODULES = ("numpy", "plotly")
+
+logger_main = logging.getLogger(__name__)
+logger_main.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_main.addHandler(handler)
+
+
+def create_app(profile: str = settings.APP_PROFILE) -> FastAPI:
+    """
+    Build the application
+    profile: full = all routers, api = JSON only (users + api) for lean workers
+    """
+    if profile not in ("full", "api"):
+        raise ValueError(f"Unknown app profile: {profile}")
+    app = FastAPI()
+    app.state.profile = profile
+    app.add_middleware(compression.CompressionMiddleware)
+    # Added last, so the outermost: request latency includes compression
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    if profile == "full":
+        from routers.weather import router as router_weather
+        from services.assets import PLOTLY_PREFIX, plotly_static
+
+        app.mount(PLOTLY_PREFIX, plotly_static(), name="plotly")
+        app.include_router(
+            router_weather,
+            prefix="/weather",
+            tags=["weather"]
+        )
+
+    app.include_router(
+        router_users,
+        prefix="/users",
+        tags=["users"]
+    )
+
+    app.include_router(
+        router_api,
+        prefix="/api/v1",
+        tags=["api"]
+    )
+
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        """
+        Prometheus metrics, merged over all gunicorn workers
+        """
+        return Response(metrics.latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+    @app.on_event("startup")
+    async def startup():
+        await upstream.start_client()
+        gazetteer.get_index()
+        revocation.start()
+        if profile == "full":
+            from services import assets
+
+            # Takes seconds on first start, assets are served meanwhile
+            asyncio.get_running_loop().run_in_executor(None, assets.precompress)
+        app.state.startup = startup_report(profile)
+        logger_main.info(f"Startup report: {app.state.startup}")
+        report = app.state.startup
+        metrics.STARTUP_SECONDS.labels(profile).set(report["import_seconds"])
+        metrics.STARTUP_MAX_RSS.labels(profile).set(report["max_rss_mb"] * 1024 * 1024)
+        metrics.HEAVY_MODULES_LOADED.labels(profile).set(len(report["heavy_modules"]))
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await revocation.stop()
+        await upstream.close_client()
+        await store.close_redis()
+        await db.close_async_engine()
+        render.shutdown()
+        passwords.executor.shutdown(wait=False)
+
+    return app
+
+
+def startup_report(profile: str = settings.APP_PROFILE) -> dict:
+    """
+    Import time of the app, peak RSS of this process and heavy modules loaded
+    """
+    return {
+        "profile": profile,
+        "import_seconds": round(time.perf_counter() - STARTED, 3),
+        "max_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "heavy_modules": [i for i in HEAVY_MODULES if i in sys.modules],
+    }
 
-app.include_router(
-    router_users,
-    prefix="/users",
-    tags=["users"]
-)
 
-app.include_router(
-    router_api,
-    prefix="/api/v1",
-    tags=["api"]
-)
\ No newline at end of file
+app = create_app()
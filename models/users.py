@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from db import Base
@@ -23,9 +23,5 @@ class Item(Base):
 
     owner = relationship("User", back_populates="items")
 
-
-class Blacklist(Base):
-    __tablename__ = "blacklist"
-
-    id = Column(Integer, primary_key=True, index=True)
-    token = Column(String, unique=True)
+    # Keyset pagination of a user's items
+    __table_args__ = (Index("ix_items_user_id_id", "user_id", "id"),)
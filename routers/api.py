@@ -7,27 +7,37 @@ from fastapi import (
     Depends,
     HTTPException,
     Header,
+    Query,
     Response,
 )
 
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import (
+    JSONResponse,
+    HTMLResponse,
+    FileResponse,
+    ORJSONResponse,
+    StreamingResponse,
+)
 
-import requests
 import json
 import logging
+import orjson
 from datetime import date, datetime, timezone, tzinfo
+from typing import Callable, Dict, Iterable, List, Optional
 from geopy.geocoders import Nominatim
 
-from schemas.weather import CurrentWeather, CityList
+from schemas.weather import CurrentWeather, CurrentWeatherFields, CityList, CityMatch
+from services import gazetteer, popularity, upstream
+from services.fanout import stream_cities_weather
+from services.geocoding import get_city
 from settings import Settings
 
 settings = Settings()
 
 # geolocator = Nominatim(user_agent="weather_app")
-from .weather import get_city, get_today
+from .common import get_today
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 logger_api = logging.getLogger(__name__)
 logger_api.setLevel(logging.INFO)
@@ -37,26 +47,94 @@ format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
 handler.setFormatter(format)
 logger_api.addHandler(handler)
 
+FIELDS = Query(None, description="comma separated fields to return, default all fields")
+SERIES_FORMAT = Query(
+    "rows",
+    regex="^(rows|columns)$",
+    description="rows = list of records, columns = one list per field",
+)
+
+# Series fields and how to read them from an OpenWeather list entry
+FORECAST_SERIES = {
+    "date": lambda i: i["dt_txt"],
+    "temperature": lambda i: i["main"]["feels_like"],
+}
+POLLUTION_SERIES = {
+    "date": lambda i: i["dt"],
+    "CO": lambda i: i["components"]["co"],
+    "NO2": lambda i: i["components"]["no2"],
+    "O3": lambda i: i["components"]["o3"],
+    "SO2": lambda i: i["components"]["so2"],
+}
+
+
+def select_fields(fields: Optional[str], known: Iterable[str]) -> List[str]:
+    """
+    Requested field names in request order, 400 for unknown names
+    """
+    known = list(known)
+    if not fields:
+        return known
+    selected = list(dict.fromkeys(i.strip() for i in fields.split(",") if i.strip()))
+    unknown = [i for i in selected if i not in known]
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {unknown}, available: {known}",
+        )
+    return selected
+
+
+def series_response(
+    entries: List[dict],
+    series: Dict[str, Callable],
+    fields: Optional[str],
+    format: str,
+) -> ORJSONResponse:
+    """
+    Build the requested fields straight from the upstream entries,
+    as a list of records or as {field: [values]} columns
+    """
+    names = select_fields(fields, series)
+    getters = [series[i] for i in names]
+    if format == "columns":
+        data = {name: [get(i) for i in entries] for name, get in zip(names, getters)}
+    else:
+        data = [{name: get(i) for name, get in zip(names, getters)} for i in entries]
+    return ORJSONResponse(data)
+
 
 @router.get(
-    "/current/{city}", response_model=CurrentWeather, status_code=status.HTTP_200_OK
+    "/current/{city}",
+    response_model=None,
+    responses={200: {"model": CurrentWeatherFields}},
+    status_code=status.HTTP_200_OK,
 )
-async def get_current_temperature(city: str, units: str = "metric"):
+async def get_current_temperature(
+    city: str, units: str = "metric", fields: Optional[str] = FIELDS
+):
     """
     Get current weather by city
     Optional[units]: default = metric
     metric = Celsius
     imperial = Fahrenheit
+    Optional[fields]: only these CurrentWeather fields are returned
     """
-    location = get_city(city)
+    include = set(select_fields(fields, CurrentWeather.__fields__))
+    location = await get_city(city)
+    popularity.track(city)
     logger_api.info(
         f"place: {city} | lat: {location.latitude} | lon: {location.longitude}"
     )
-    response = requests.post(
-        f"https://api.openweathermap.org/data/2.5/weather?lat={location.latitude}&lon={location.longitude}&units={units}&appid={settings.OPEN_WEATHER_KEY}"
-    ).json()
-    data = jsonable_encoder(response)
-    weather = CurrentWeather(
+    response = await upstream.fetch_weather(
+        location.latitude, location.longitude, units, location.city_id
+    )
+    # The model is built from trusted data, skip response_model validation
+    return ORJSONResponse(current_weather(response).dict(include=include))
+
+
+def current_weather(data: dict) -> CurrentWeather:
+    return CurrentWeather(
         place=data["name"],
         today=get_today(),
         temperature=data["main"]["feels_like"],
@@ -65,48 +143,108 @@ async def get_current_temperature(city: str, units: str = "metric"):
         pressure=data["main"]["pressure"],
         humidity=data["main"]["humidity"],
     )
-    return weather
+
+
+def stream_current(cities: Iterable[str], units: str, accept: str):
+    """
+    One record per city in the order they resolve:
+    {"city": ..., "weather": CurrentWeather} or {"city": ..., "error": ...}
+    NDJSON by default, Server-Sent Events for Accept: text/event-stream
+    """
+    sse = "text/event-stream" in accept
+
+    async def records():
+        async for result in stream_cities_weather(cities, units):
+            if result.error is None:
+                popularity.track(result.city)
+                record = {
+                    "city": result.city,
+                    "weather": current_weather(result.weather).dict(),
+                }
+            else:
+                record = {"city": result.city, "error": result.error}
+            line = orjson.dumps(record)
+            yield b"data: " + line + b"\n\n" if sse else line + b"\n"
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    # Proxies must not buffer the stream, the first city is sent at once
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(records(), media_type=media_type, headers=headers)
+
+
+@router.get("/current", status_code=status.HTTP_200_OK)
+async def get_current_cities(
+    city: List[str] = Query(default=[]),
+    units: str = "metric",
+    accept: str = Header(default=""),
+):
+    """
+    Stream current weather of ?city=...&city=... (usable from EventSource)
+    """
+    return stream_current(city, units, accept)
+
+
+@router.post("/current", status_code=status.HTTP_200_OK)
+async def post_current_cities(
+    city_list: CityList, units: str = "metric", accept: str = Header(default="")
+):
+    """
+    Stream current weather of a city list, as NDJSON or Server-Sent Events
+    Per-city errors are sent inline, the response status stays 200
+    """
+    cities = [city.name for city in city_list.cities or []]
+    return stream_current(cities, units, accept)
+
+
+@router.get(
+    "/cities/autocomplete",
+    response_model=List[CityMatch],
+    status_code=status.HTTP_200_OK,
+)
+async def get_city_autocomplete(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Cities whose name starts with q, most populated first
+    Served from the local gazetteer, empty without one
+    """
+    return [i._asdict() for i in gazetteer.search(q, limit)]
 
 
 @router.get("/forecast/{city}", status_code=status.HTTP_200_OK)
-async def get_stat_json_city(city: str, units: str = "metric"):
+async def get_stat_json_city(
+    city: str,
+    units: str = "metric",
+    fields: Optional[str] = FIELDS,
+    format: str = SERIES_FORMAT,
+):
     """
     Get weather forecast for next 5 days
     with every 3 hours
+    Optional[fields]: date, temperature
     """
-    location = get_city(city)
-    response = requests.post(
-        f"https://api.openweathermap.org/data/2.5/forecast?lat={location.latitude}&lon={location.longitude}&units={units}&appid={settings.OPEN_WEATHER_KEY}"
-    ).json()
+    location = await get_city(city)
+    popularity.track(city)
+    response = await upstream.fetch_forecast(
+        location.latitude, location.longitude, units
+    )
     logger_api.info(
         f"city forecast: {city} | lat: {location.latitude} | lon: {location.longitude}"
     )
-    json_data = jsonable_encoder(response)
-    result = [
-        {"date": i["dt_txt"], "temperature": i["main"]["feels_like"]}
-        for i in json_data["list"]
-    ]
-    return JSONResponse(result)
+    return series_response(response["list"], FORECAST_SERIES, fields, format)
 
 
 @router.get("/pollution/{city}", status_code=status.HTTP_200_OK)
-async def get_pollution(city: str):
+async def get_pollution(
+    city: str, fields: Optional[str] = FIELDS, format: str = SERIES_FORMAT
+):
     """
     Get pollution forecast for the city
+    Optional[fields]: date, CO, NO2, O3, SO2
     """
-    location = get_city(city)
+    location = await get_city(city)
+    popularity.track(city)
     logger_api.info(f"Pollution forecast for {city}")
-    response = requests.get(
-        f"http://api.openweathermap.org/data/2.5/air_pollution/forecast?lat={location.latitude}&lon={location.longitude}&appid={settings.OPEN_WEATHER_KEY}"
-    ).json()
-    data = [
-        {
-            "date": i["dt"],
-            "CO": i["components"]["co"],
-            "NO2": i["components"]["no2"],
-            "O3": i["components"]["o3"],
-            "SO2": i["components"]["so2"],
-        }
-        for i in response["list"]
-    ]
-    return JSONResponse(data)
\ No newline at end of file
+    response = await upstream.fetch_pollution(location.latitude, location.longitude)
+    return series_response(response["list"], POLLUTION_SERIES, fields, format)
@@ -1,7 +1,12 @@
 import time
-from typing import Dict
+from typing import Dict, NamedTuple
 
 import jwt
+from fastapi import Depends, HTTPException
+from fastapi.security import APIKeyHeader
+
+from services import metrics, revocation
+from services.cache import MISSING, LRUCache
 from settings import Settings
 
 settings = Settings()
@@ -9,13 +14,24 @@ settings = Settings()
 JWT_SECRET = settings.SECRET
 JWT_ALGORITHM = settings.ALGORITHM
 
+api_key_header = APIKeyHeader(name="Token")
+
+# Verified tokens, kept until they expire
+tokens = LRUCache(settings.AUTH_CACHE_SIZE)
+
+
+class TokenUser(NamedTuple):
+    id: int
+    login: str
+    expires: float
+
 
 def token_response(token: str):
     return {"access_token": token}
 
 
-def signJWT(user_id: str) -> Dict[str, str]:
-    payload = {"user_id": user_id, "expires": time.time() + 600}
+def signJWT(user_id: str, id: int) -> Dict[str, str]:
+    payload = {"user_id": user_id, "id": id, "expires": time.time() + 600}
     token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
     return token_response(token)
@@ -29,8 +45,35 @@ def decodeJWT(token: str):
         return False
 
 
-def transferJWT(user_id: str) -> str:
-    payload = {"user_id": user_id, "expires": time.time() + 300}
+def transferJWT(user_id: str, **claims) -> str:
+    payload = {
+        "user_id": user_id,
+        **claims,
+        "expires": time.time() + settings.TRANSFER_TTL,
+    }
     token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
     return token
+
+
+async def current_user(token: str = Depends(api_key_header)) -> TokenUser:
+    """
+    User of the Token header
+    The token is verified once and cached until it expires,
+    revocation is checked on every call
+    """
+    user = tokens.get(token)
+    metrics.cache_result("auth", "miss" if user is MISSING else "hit")
+    if user is MISSING:
+        token_jwt = decodeJWT(token)
+        if not token_jwt or "id" not in token_jwt:
+            raise HTTPException(status_code=401, detail="Access denied")
+        user = TokenUser(
+            id=token_jwt["id"],
+            login=token_jwt["user_id"],
+            expires=token_jwt["expires"],
+        )
+        tokens.set(token, user, user.expires - time.time())
+    if await revocation.is_revoked(token):
+        raise HTTPException(status_code=401, detail="Access denied")
+    return user
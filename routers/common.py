@@ -0,0 +1,6 @@
+from datetime import date
+
+
+def get_today():
+    today_raw = date.today()
+    return today_raw.strftime("%d-%m-%Y")
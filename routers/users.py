@@ -1,11 +1,13 @@
+import json
 import logging
 import sys
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Header, Body, status
-from fastapi.security import APIKeyHeader
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from typing import Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Header, Body, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
 from schemas.users import (
     UserCreate,
@@ -15,16 +17,27 @@ from schemas.users import (
     ItemCreate,
     ItemPublic,
     UserItems,
+    ItemTitles,
+    ItemIds,
+    ItemsSend,
+    ItemResult,
 )
-from models.users import Blacklist, User, Item
-from routers.auth import signJWT, decodeJWT, transferJWT
-from db import get_db
+from models.users import User, Item
+from routers.auth import (
+    TokenUser,
+    api_key_header,
+    current_user,
+    decodeJWT,
+    signJWT,
+    tokens,
+    transferJWT,
+)
+from db import get_async_db
+from services import passwords, revocation, transfers
 from settings import Settings
 
 settings = Settings()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 handler = logging.StreamHandler(sys.stdout)
@@ -34,75 +47,88 @@ logger.addHandler(handler)
 
 router = APIRouter()
 
-api_key_header = APIKeyHeader(name="Token")
-
 
-def blacklist_check(token: str, db: Session = Depends(get_db)):
+def check_batch(values: list):
     """
-    Check token in blacklist
+    Reject empty batches and batches over ITEMS_BATCH_SIZE
     """
-    check = db.query(Blacklist).filter(Blacklist.token == token).first()
-    if check:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    if not values or len(values) > settings.ITEMS_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Send from 1 to {settings.ITEMS_BATCH_SIZE} items",
+        )
+    # Keep the first occurrence, a batch handles each item once
+    return list(dict.fromkeys(values))
 
 
-def check_user(user: UserCreate, db: Session = Depends(get_db)):
+async def check_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
-    Check user in db
+    Check user in db, return the user when the password matches
+    Rehash the password when BCRYPT_ROUNDS changed
     """
+    result = await db.execute(select(User).where(User.login == user.login))
+    user_db = result.scalars().first()
+    if not user_db:
+        return None
     try:
-        user_db = db.query(User).filter(User.login == user.login).first()
-        varify_password = pwd_context.verify(user.password, user_db.password)
-        if user_db and varify_password:
-            return True
-        return False
-    except:
-        False
+        varify_password, new_hash = await passwords.verify_password(
+            user.password, user_db.password
+        )
+    except ValueError:
+        return None
+    if not varify_password:
+        return None
+    if new_hash:
+        logger.info(f"Rehash password: {user.login}")
+        user_db.password = new_hash
+        await db.commit()
+    return user_db
 
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new user
     """
     logger.info(f"SignUp a new user: {user.login}")
-    user_db = db.query(User).filter(User.login == user.login).first()
-    if user_db:
+    hashed_password = await passwords.hash_password(user.password)
+    # users.login is unique, a taken login inserts nothing
+    result = await db.execute(
+        insert(User)
+        .values(login=user.login, password=hashed_password)
+        .on_conflict_do_nothing(index_elements=[User.login])
+        .returning(User.id)
+    )
+    new_user_id = result.scalar()
+    if new_user_id is None:
         raise HTTPException(status_code=400, detail="Login already exists.")
-    hashed_password = pwd_context.hash(user.password)
-    new_user = User(login=user.login, password=hashed_password)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return signJWT(new_user.login)
+    await db.commit()
+    return signJWT(user.login, new_user_id)
 
 
 @router.post("/login", status_code=status.HTTP_200_OK)
-async def user_login(user: UserCreate, db: Session = Depends(get_db)):
+async def user_login(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     User login
     """
     logging.info(f"Login user: {user.login}")
-    if check_user(user, db):
-        return signJWT(user.login)
+    user_db = await check_user(user, db)
+    if user_db:
+        return signJWT(user_db.login, user_db.id)
     raise HTTPException(status_code=403, detail="Unauthorized")
 
 
 @router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
 async def exit_user(
-    db: Session = Depends(get_db),
     token: str = Depends(api_key_header),
+    user: TokenUser = Depends(current_user),
 ):
     """
     User logout
     """
-    token_jwt = decodeJWT(token)
-    if not token_jwt:
-        raise HTTPException(status_code=401, detail="Access denied")
-    token_blacklist = Blacklist(token=token)
-    logger.info(f"User logout: {token_jwt['user_id']}")
-    db.add(token_blacklist)
-    db.commit()
+    logger.info(f"User logout: {user.login}")
+    await revocation.revoke(token, user.expires)
+    tokens.pop(token)
     return True
 
 
@@ -111,111 +137,277 @@ async def exit_user(
 )
 async def create_item(
     item: ItemBase,
-    db: Session = Depends(get_db),
-    token: str = Depends(api_key_header),
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenUser = Depends(current_user),
 ):
     """
     Create a item
     """
-    blacklist = blacklist_check(token, db)
-    token_jwt = decodeJWT(token)
-    if not token_jwt:
-        raise HTTPException(status_code=401, detail="Access denied")
     logging.info(f"Create a item: {item}")
-    user_db = db.query(User).filter(User.login == token_jwt["user_id"]).first()
-    new_item = Item(title=item.title, user_id=user_db.id)
+    new_item = Item(title=item.title, user_id=user.id)
     db.add(new_item)
-    db.commit()
-    db.refresh(new_item)
+    await db.commit()
+    await db.refresh(new_item)
     return new_item
 
 
+@router.post(
+    "/items/bulk",
+    response_model=List[ItemResult],
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_items(
+    items: ItemTitles,
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenUser = Depends(current_user),
+):
+    """
+    Create many items in one statement, titles already taken are skipped
+    """
+    titles = check_batch(items.titles)
+    logger.info(f"Create items: {len(titles)}, user: {user.login}")
+    result = await db.execute(
+        insert(Item)
+        .values([{"title": title, "user_id": user.id} for title in titles])
+        .on_conflict_do_nothing(index_elements=[Item.title])
+        .returning(Item.id, Item.title)
+    )
+    created = {title: id for id, title in result.all()}
+    await db.commit()
+    return [
+        ItemResult(id=created[title], title=title, status="created")
+        if title in created
+        else ItemResult(title=title, status="exists")
+        for title in titles
+    ]
+
+
+@router.post(
+    "/items/bulk/delete",
+    response_model=List[ItemResult],
+    status_code=status.HTTP_200_OK,
+)
+async def delete_items(
+    items: ItemIds,
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenUser = Depends(current_user),
+):
+    """
+    Delete many users items by id in one statement
+    """
+    ids = check_batch(items.ids)
+    logger.info(f"Delete items: {len(ids)}, user: {user.login}")
+    result = await db.execute(
+        delete(Item).where(Item.user_id == user.id, Item.id.in_(ids)).returning(Item.id)
+    )
+    deleted = set(result.scalars().all())
+    await db.commit()
+    return [
+        ItemResult(id=id, status="deleted" if id in deleted else "not_found")
+        for id in ids
+    ]
+
+
 @router.delete("/items/{id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_item(
     id: int,
-    db: Session = Depends(get_db),
-    token: str = Depends(api_key_header),
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenUser = Depends(current_user),
 ):
     """
     Delete users item by id
     """
     logger.info(f"Delete item: {id}")
-    token = decodeJWT(token)
-    if not token:
-        raise HTTPException(status_code=401, detail="Access denied")
-    item = db.query(Item).filter(Item.id == id).first()
-    user = db.query(User).filter(User.login == token["user_id"]).first()
-    if item.user_id != user.id:
+    result = await db.execute(
+        delete(Item).where(Item.id == id, Item.user_id == user.id)
+    )
+    if not result.rowcount:
         raise HTTPException(status_code=400, detail=f"Cant find item id: {id}")
-    logger.info(f"Delete item id: {id} user_id: {item.user_id}")
-    db.delete(item)
-    db.commit()
+    logger.info(f"Delete item id: {id} user_id: {user.id}")
+    await db.commit()
     return True
 
 
 @router.get("/items", response_model=UserItems, status_code=status.HTTP_200_OK)
 async def get_items(
-    db: Session = Depends(get_db),
-    token: str = Depends(api_key_header),
+    cursor: Optional[int] = Query(None, description="next_cursor of the last page"),
+    limit: int = Query(settings.ITEMS_PAGE_SIZE, ge=1, le=settings.ITEMS_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenUser = Depends(current_user),
 ):
 
     """
-    Get all user items
+    Get a page of user items ordered by id
     """
-    token = decodeJWT(token)
-    if not token:
-        raise HTTPException(status_code=401, detail="Access denied")
-    logger.info(f"Users items for {token['user_id']}")
-    user = db.query(User).filter(User.login == token["user_id"]).first()
-    items = db.query(Item).filter(Item.user_id == user.id).all()
-    logging.info(f"Get all items, user: {user.login}, items: {len(items)}")
-    result = UserItems(user=user, items=items)
+    logger.info(f"Users items for {user.login}")
+    query = select(Item).where(Item.user_id == user.id)
+    if cursor is not None:
+        query = query.where(Item.id > cursor)
+    # One extra row tells if there is a next page
+    result = await db.execute(query.order_by(Item.id).limit(limit + 1))
+    items = result.scalars().all()
+    next_cursor = items[limit - 1].id if len(items) > limit else None
+    items = items[:limit]
+    logging.info(f"Get items, user: {user.login}, items: {len(items)}")
+    result = UserItems(
+        user=UserPublic(id=user.id, login=user.login),
+        items=items,
+        next_cursor=next_cursor,
+    )
     return result
 
 
+@router.get("/items/export", status_code=status.HTTP_200_OK)
+async def export_items(
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenUser = Depends(current_user),
+):
+    """
+    Stream all user items as one JSON document
+    """
+    logger.info(f"Export items for {user.login}")
+    rows = await db.stream_scalars(
+        select(Item)
+        .where(Item.user_id == user.id)
+        .order_by(Item.id)
+        .execution_options(yield_per=settings.ITEMS_EXPORT_CHUNK)
+    )
+
+    async def content():
+        owner = json.dumps({"id": user.id, "login": user.login})
+        yield f'{{"user": {owner}, "items": ['
+        separator = ""
+        async for partition in rows.partitions():
+            chunk = ", ".join(
+                json.dumps({"title": item.title, "id": item.id}) for item in partition
+            )
+            if chunk:
+                yield separator + chunk
+                separator = ", "
+        yield "]}"
+
+    return StreamingResponse(content(), media_type="application/json")
+
+
 @router.post("/send", status_code=status.HTTP_201_CREATED)
 async def send_item(
     user_login: str = Body(...),
     item_id: int = Body(...),
-    db: Session = Depends(get_db),
-    token: str = Depends(api_key_header),
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenUser = Depends(current_user),
 ):
     """
     Send users item to other user
     """
-    token = decodeJWT(token)
-    if not token:
-        raise HTTPException(status_code=401, detail="Access denied")
-    user = db.query(User).filter(User.login == token["user_id"]).first()
-    item = db.query(Item).filter(Item.id == item_id).first()
-    if item.user_id != user.id:
+    item = await db.get(Item, item_id)
+    if not item or item.user_id != user.id:
         raise HTTPException(status_code=400, detail=f"Cant find item id: {item_id}")
     logging.info(f"Item transfer from user: {user.login}, item: {item.id}")
-    user_login_jwt = transferJWT(user_login)
+    # Stored server side like bulk transfers, so the link works once
+    transfer_id = await transfers.create(user.id, [item_id])
+    user_login_jwt = transferJWT(user_login, transfer=transfer_id, items=[item_id])
     user_token = user_login_jwt.decode("utf-8")
     url = f"{settings.BACKEND_URL}/{user_token}/{item_id}"
     return url
 
 
+@router.post("/send/bulk", status_code=status.HTTP_201_CREATED)
+async def send_items(
+    items: ItemsSend,
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenUser = Depends(current_user),
+):
+    """
+    Send many users items to other user with one transfer link
+    """
+    ids = check_batch(items.item_ids)
+    result = await db.execute(
+        select(Item.id).where(Item.user_id == user.id, Item.id.in_(ids))
+    )
+    owned = set(result.scalars().all())
+    logging.info(f"Items transfer from user: {user.login}, items: {len(owned)}")
+    # The item list is kept server side, the link only names the transfer
+    transfer_id = await transfers.create(user.id, [id for id in ids if id in owned])
+    user_login_jwt = transferJWT(items.user_login, transfer=transfer_id)
+    user_token = user_login_jwt.decode("utf-8")
+    return {
+        "url": f"{settings.BACKEND_URL}/transfer/{user_token}",
+        "items": [
+            ItemResult(id=id, status="ready" if id in owned else "not_found")
+            for id in ids
+        ],
+    }
+
+
+@router.get(
+    "/transfer/{user_token}",
+    response_model=List[ItemResult],
+    status_code=status.HTTP_200_OK,
+)
+async def get_transfers(
+    user_token: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenUser = Depends(current_user),
+):
+    """
+    Get many items transfer in one statement
+    Items the sender no longer owns are skipped, the link works once
+    """
+    check_user_token = decodeJWT(user_token)
+    if (
+        not check_user_token
+        or check_user_token["user_id"] != user.login
+        or "transfer" not in check_user_token
+    ):
+        raise HTTPException(status_code=400, detail="Something wrong!")
+    transfer = await transfers.take(check_user_token["transfer"])
+    if transfer is None:
+        raise HTTPException(status_code=404, detail="Transfer not found or used")
+    ids = transfer["items"]
+    logging.info(f"Get items transfer, items: {len(ids)}, user: {user.login}")
+    result = await db.execute(
+        update(Item)
+        .where(Item.user_id == transfer["sender"], Item.id.in_(ids))
+        .values(user_id=user.id)
+        .returning(Item.id)
+    )
+    moved = set(result.scalars().all())
+    await db.commit()
+    return [
+        ItemResult(id=id, status="moved" if id in moved else "not_found") for id in ids
+    ]
+
+
 @router.get("/{user_token}/{item_id}", status_code=status.HTTP_200_OK)
 async def get_transfer(
     user_token: str,
     item_id: int,
-    db: Session = Depends(get_db),
-    token: str = Depends(api_key_header),
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenUser = Depends(current_user),
 ):
     """
-    Get item transfer
+    Get item transfer, the link works once
     """
-    token = decodeJWT(token)
-    if not token:
-        raise HTTPException(status_code=401, detail="Access denied")
-    logging.info(f"Get item transfer, item: {item_id}, user: {token['user_id']}")
-    user = db.query(User).filter(User.login == token["user_id"]).first()
+    logging.info(f"Get item transfer, item: {item_id}, user: {user.login}")
     check_user_token = decodeJWT(user_token)
-    if not user or check_user_token["user_id"] != user.login:
+    if (
+        not check_user_token
+        or check_user_token["user_id"] != user.login
+        or "transfer" not in check_user_token
+        or item_id not in check_user_token.get("items", ())
+    ):
         raise HTTPException(status_code=400, detail="Something wrong!")
-    item = db.query(Item).filter(Item.id == item_id).first()
-    item.user_id = user.id
-    db.commit()
+    transfer = await transfers.take(check_user_token["transfer"])
+    if transfer is None:
+        raise HTTPException(status_code=404, detail="Transfer not found or used")
+    # Moves the item only while the sender still owns it
+    result = await db.execute(
+        update(Item)
+        .where(Item.id == item_id, Item.user_id == transfer["sender"])
+        .values(user_id=user.id)
+        .returning(Item.id)
+    )
+    if result.scalar() is None:
+        raise HTTPException(status_code=400, detail=f"Cant find item id: {item_id}")
+    await db.commit()
     return {"status": "ok"}
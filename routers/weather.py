@@ -7,31 +7,38 @@ from fastapi import (
     Depends,
     HTTPException,
     Header,
+    Query,
+    Request,
     Response,
 )
 from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
 from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
 
-from geopy.geocoders import Nominatim
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-
-import requests
 import json
 import logging
+import mimetypes
 from datetime import date, datetime, timezone, tzinfo
 
 from schemas.weather import CurrentWeather, CityList
+from services import artifacts, charts, compression, popularity, upstream
+from services.assets import include_plotlyjs
+from services.fanout import cities_weather
+from services.geocoding import get_city
+from services.render import render
+from services.singleflight import SingleFlight
 from settings import Settings
 
 settings = Settings()
 
-geolocator = Nominatim(user_agent="weather_app")
-
 router = APIRouter()
 
+renders = SingleFlight()
+
+CHART_FORMAT = Query(
+    "html", regex="^(html|json)$", description="html page or plotly figure json"
+)
+
 
 logger_weather = logging.getLogger(__name__)
 logger_weather.setLevel(logging.INFO)
@@ -42,30 +49,88 @@ handler.setFormatter(format)
 logger_weather.addHandler(handler)
 
 
-def get_city(city: str):
-    location = geolocator.geocode(city)
-    return location
-
-
-def get_today():
-    today_raw = date.today()
-    return today_raw.strftime("%d-%m-%Y")
+def cities_data(results):
+    """
+    Split fan-out results into chart rows and per-city errors
+    Fails only when no city could be fetched
+    """
+    data = {
+        i.city: (i.place.latitude, i.place.longitude, i.weather["main"]["feels_like"])
+        for i in results
+        if i.error is None
+    }
+    for city in data:
+        popularity.track(city)
+    errors = {i.city: i.error for i in results if i.error is not None}
+    if errors:
+        logger_weather.info(f"cities failed: {errors}")
+    if not data:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=errors)
+    return data, errors
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [i.strip() for i in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+async def chart_response(request: Request, format: str, chart, *args) -> Response:
+    """
+    Serve a chart from the artifact cache, render it on a miss
+    format: html = page loading plotly.js from CHART_PLOTLYJS, json = figure json
+    The ETag is the chart content address, a matching If-None-Match gets 304
+    Clients accepting br or gzip get the compressed variant kept next to the chart
+    """
+    plotlyjs = include_plotlyjs() if format == "html" else None
+    key = artifacts.chart_key(charts.VERSION, chart.__name__, format, plotlyjs, *args)
+    encoding = compression.negotiate(request.headers.get("accept-encoding", ""))
+    # Every encoding is another representation with its own ETag
+    etag = f'"{key}"' if encoding is None else f'"{key}-{encoding}"'
+    headers = {"etag": etag, "cache-control": "no-cache", "vary": "Accept-Encoding"}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    path = artifacts.chart_path(key, format)
+    if not artifacts.hit(path):
+        if format == "json":
+            job = (charts.write_json, path, chart, *args)
+        else:
+            job = (charts.write_html, path, plotlyjs, chart, *args)
+        await renders.do(key, render, *job)
+        await run_in_threadpool(artifacts.maybe_evict)
+    if encoding is None:
+        return FileResponse(path, headers=headers)
+    variant = await run_in_threadpool(artifacts.compressed, path, encoding)
+    headers["content-encoding"] = encoding
+    media_type = mimetypes.guess_type(path)[0]
+    return FileResponse(variant, media_type=media_type, headers=headers)
+
+
+def errors_title(errors):
+    if not errors:
+        return ""
+    return " | failed: " + ", ".join(f"{k} ({v})" for k, v in errors.items())
 
 
 @router.get(
     "/current/{city}", response_class=FileResponse, status_code=status.HTTP_200_OK
 )
-async def get_current(city: str, units: str = "metric"):
+async def get_current(
+    request: Request, city: str, units: str = "metric", format: str = CHART_FORMAT
+):
     """
     Get table with current weather
     """
-    location = get_city(city)
+    location = await get_city(city)
+    popularity.track(city)
     logger_weather.info(
         f"place: {city} | lat: {location.latitude} | lon: {location.longitude}"
     )
-    response = requests.post(
-        f"https://api.openweathermap.org/data/2.5/weather?lat={location.latitude}&lon={location.longitude}&units={units}&appid={settings.OPEN_WEATHER_KEY}"
-    ).json()
+    response = await upstream.fetch_weather(
+        location.latitude, location.longitude, units, location.city_id
+    )
     json_data = jsonable_encoder(response)
     temp_data = [
         {
@@ -77,36 +142,15 @@ async def get_current(city: str, units: str = "metric"):
             "pressure": json_data["main"]["pressure"],
         }
     ]
-    df = pd.DataFrame.from_dict(temp_data)
-    fig = go.Figure(
-        data=[
-            go.Table(
-                header=dict(
-                    values=list(df.columns), fill_color="paleturquoise", align="left"
-                ),
-                cells=dict(
-                    values=[
-                        df.temp,
-                        df.feels_like,
-                        df.min_temp,
-                        df.max_temp,
-                        df.humidity,
-                        df.pressure,
-                    ],
-                    fill_color="lavender",
-                    align="left",
-                ),
-            )
-        ]
-    )
-    fig.write_html(f"stats/current_{city}.html")
-    return FileResponse(f"stats/current_{city}.html")
+    return await chart_response(request, format, charts.current_table, temp_data)
 
 
 @router.get(
     "/forecast/{city}", response_class=FileResponse, status_code=status.HTTP_200_OK
 )
-async def get_stat_chart_by_city(city: str, units: str = "metric"):
+async def get_stat_chart_by_city(
+    request: Request, city: str, units: str = "metric", format: str = CHART_FORMAT
+):
     """
     Get weather forecast for next 5 days
     Return html chart
@@ -114,10 +158,11 @@ async def get_stat_chart_by_city(city: str, units: str = "metric"):
     metric = Celsius
     imperial = Fahrenheit
     """
-    location = geolocator.geocode(city)
-    response = requests.post(
-        f"https://api.openweathermap.org/data/2.5/forecast?lat={location.latitude}&lon={location.longitude}&units={units}&appid={settings.OPEN_WEATHER_KEY}"
-    ).json()
+    location = await get_city(city)
+    popularity.track(city)
+    response = await upstream.fetch_forecast(
+        location.latitude, location.longitude, units
+    )
     logger_weather.info(
         f"city bar chart forecast: {city} | lat: {location.latitude} | lon: {location.longitude}"
     )
@@ -125,107 +170,61 @@ async def get_stat_chart_by_city(city: str, units: str = "metric"):
     temp = [i["main"]["feels_like"] for i in json_data["list"]]
     time = [i["dt_txt"] for i in json_data["list"]]
     data = {"temperature": temp, "date": time}
-    df = pd.DataFrame(data=data)
-    df["date"] = pd.to_datetime(df.date)
-    # df["time"] = df["time"].dt.strftime("%d/%m/%Y")
-    # fig = px.line(df, x="date", y="temperature", markers=True)
-    fig = px.scatter(
-        df,
-        x="date",
-        y="temperature",
-        title=f"Weather forecast for next 5 days for: {city}",
-        trendline="ols",
-    )
-    fig.write_html(f"stats/forecast_{city}.html")
-    return FileResponse(f"stats/forecast_{city}.html")
+    return await chart_response(request, format, charts.forecast, city, data)
 
 
 @router.get(
     "/chart/cities", response_class=FileResponse, status_code=status.HTTP_200_OK
 )
-async def get_cities_chart(city_list: CityList, units: str = "metric"):
+async def get_cities_chart(
+    request: Request,
+    city_list: CityList,
+    units: str = "metric",
+    format: str = CHART_FORMAT,
+):
     """
     Get current weather bar chart for citites list
     """
     cities = tuple(city.name for city in city_list.cities)
     logger_weather.info(f"cities bar chart: {cities}")
-    data = {}
-    for city in cities:
-        location = geolocator.geocode(city)
-        response = requests.post(
-            f"https://api.openweathermap.org/data/2.5/weather?lat={location.latitude}&lon={location.longitude}&units={units}&appid={settings.OPEN_WEATHER_KEY}"
-        ).json()
-        data[city] = (
-            location.latitude,
-            location.longitude,
-            response["main"]["feels_like"],
-        )
-    df = pd.DataFrame.from_dict(
-        data, orient="index", columns=["latitude", "longitude", "temperature"]
-    )
-    # df.index.name = "city"
-    fig = px.bar(
-        df,
-        x=df.index,
-        y="temperature",
-        title=f"Current temperature for {[i for i in df.index]}",
-        color=df.index,
-    )
-    # fig.show()
-    fig.write_html(f"stats/{[i for i in df.index]}.html")
-    return FileResponse(f"stats/{[i for i in df.index]}.html")
+    data, errors = cities_data(await cities_weather(cities, units))
+    names = [i for i in data]
+    title = f"Current temperature for {names}{errors_title(errors)}"
+    return await chart_response(request, format, charts.cities_bar, data, title)
 
 
 @router.get(
     "/map/cities", response_class=FileResponse, status_code=status.HTTP_200_OK
 )
-async def get_cities_map(city_list: CityList, units: str = "metric"):
+async def get_cities_map(
+    request: Request,
+    city_list: CityList,
+    units: str = "metric",
+    format: str = CHART_FORMAT,
+):
     """
     Get map with temperature from the cities list
     """
     cities = tuple(city.name for city in city_list.cities)
     logger_weather.info(f"cities map: {cities}")
-    data = {}
-    for city in cities:
-        location = geolocator.geocode(city)
-        response = requests.post(
-            f"https://api.openweathermap.org/data/2.5/weather?lat={location.latitude}&lon={location.longitude}&units={units}&appid={settings.OPEN_WEATHER_KEY}"
-        ).json()
-        data[city] = (
-            location.latitude,
-            location.longitude,
-            response["main"]["feels_like"],
-        )
-    df = pd.DataFrame.from_dict(
-        data, orient="index", columns=["latitude", "longitude", "temperature"]
-    )
-    df.index.name = "city"
-    fig = px.scatter_geo(
-        df,
-        lat="latitude",
-        lon="longitude",
-        color=df.index,
-        hover_name=df.index,
-        size="temperature",
-        projection="natural earth",
-    )
-    # fig.show()
-    fig.write_html(f"stats/map_{[i for i in df.index]}.html")
-    return FileResponse(f"stats/map_{[i for i in df.index]}.html")
+    data, errors = cities_data(await cities_weather(cities, units))
+    title = errors_title(errors)
+    return await chart_response(request, format, charts.cities_map, data, title)
 
 
 @router.get(
     "/pollution/forecast/{city}", response_class=FileResponse, status_code=status.HTTP_200_OK
 )
-async def get_pollution_chart(city: str):
+async def get_pollution_chart(
+    request: Request, city: str, format: str = CHART_FORMAT
+):
     """
     Get forecast pollution chart for the city
     """
     logger_weather.info(f"chart pollution forecast for {city}")
-    loc = get_city(city)
-    response = requests.get(
-        f"http://api.openweathermap.org/data/2.5/air_pollution/forecast?lat={loc.latitude}&lon={loc.longitude}&appid={settings.OPEN_WEATHER_KEY}"
-    ).json()
+    loc = await get_city(city)
+    popularity.track(city)
+    response = await upstream.fetch_pollution(loc.latitude, loc.longitude)
     data = [
         {
             "date": i["dt"],
@@ -236,16 +235,5 @@ async def get_pollution_chart(city: str):
         }
         for i in response["list"]
     ]
-    df = pd.DataFrame.from_dict(data)
     city_name = (loc.raw["display_name"]).split()[0].replace(",", "")
-    fig = make_subplots(rows=2, cols=2, subplot_titles=("CO", "NO2", "O3", "SO2"))
-    fig.add_trace(go.Scatter(x=df["date"], y=df["CO"]), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df["date"], y=df["NO2"]), row=1, col=2)
-    fig.add_trace(go.Scatter(x=df["date"], y=df["O3"]), row=2, col=1)
-    fig.add_trace(go.Scatter(x=df["date"], y=df["SO2"]), row=2, col=2)
-    fig.update_layout(
-        height=700, width=1400, title_text=f"Air pollution forecast for {city_name}"
-    )
-    # fig.show()
-    fig.write_html(f"stats/pollution_{city_name}.html")
-    return FileResponse(f"stats/pollution_{city_name}.html")
+    return await chart_response(request, format, charts.pollution, city_name, data)
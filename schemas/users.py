@@ -52,6 +52,26 @@ class ItemPublic(ItemBase):
 class UserItems(BaseModel):
     user: Optional[UserPublic]
     items: Optional[List[ItemPublic]]
+    next_cursor: Optional[int] = None
 
     class Config:
         orm_mode = True
+
+
+class ItemTitles(BaseModel):
+    titles: List[str]
+
+
+class ItemIds(BaseModel):
+    ids: List[int]
+
+
+class ItemsSend(BaseModel):
+    user_login: str
+    item_ids: List[int]
+
+
+class ItemResult(BaseModel):
+    id: Optional[int]
+    title: Optional[str]
+    status: str
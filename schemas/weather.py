@@ -22,6 +22,29 @@ class CurrentWeather(BaseModel):
         orm_mode = True
 
 
+class CurrentWeatherFields(BaseModel):
+    """
+    CurrentWeather projected by ?fields=, only the requested fields are present
+    """
+
+    place: Optional[str]
+    today: Optional[str]
+    temperature: Optional[float]
+    wind: Optional[float]
+    description: Optional[str]
+    humidity: Optional[float]
+    pressure: Optional[float]
+
+
+class CityMatch(BaseModel):
+    name: str
+    display_name: str
+    latitude: float
+    longitude: float
+    population: int
+    id: int
+
+
 class CityBase(BaseModel):
     name: str 
 
@@ -0,0 +1,234 @@
+"""
+Throughput and latency of the app against offline OpenWeather and Nominatim
+
+    python scripts/benchmark.py --concurrency 20 --requests 400
+    python scripts/benchmark.py --update          # store a new baseline
+
+Requests go through the ASGI app in process, upstream calls are served by
+tests/fakes.py with --latency seconds each. users_* scenarios need the
+DATABASE and REDIS_URL of the test setup. Every scenario is measured --runs
+times and the median of each figure is reported. Exit code is 1 when a
+scenario errors, its p95 grows or its throughput drops by more than its
+tolerance against the stored baseline: a "tolerance" key of the scenario's
+baseline entry, kept by --update, or --tolerance. Baselines are machine
+specific, update them on the machine that runs the comparison.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+from tests import fakes
+
+BASELINE = os.path.join(ROOT, "scripts", "benchmark_baseline.json")
+CITIES = list(fakes.FakeNominatim.places)
+CITY_LIST = {"cities": [{"name": i} for i in CITIES[:5]]}
+
+
+def cycle_cities():
+    return itertools.cycle(CITIES)
+
+
+def get(path: str):
+    def scenario():
+        cities = cycle_cities()
+
+        async def run(client, user):
+            return await client.get(path.format(city=next(cities)))
+
+        return run
+
+    return scenario
+
+
+def get_cities(path: str):
+    def scenario():
+        async def run(client, user):
+            return await client.request("GET", path, json=CITY_LIST)
+
+        return run
+
+    return scenario
+
+
+def users_items():
+    counter = itertools.count()
+
+    async def run(client, user):
+        if next(counter) % 2:
+            return await client.get("/users/items", headers={"token": user["token"]})
+        return await client.post(
+            "/users/items/new",
+            headers={"token": user["token"]},
+            json={"title": f"bench-{uuid.uuid4().hex}"},
+        )
+
+    return run
+
+
+def users_login():
+    async def run(client, user):
+        return await client.post("/users/login", json=user["credentials"])
+
+    return run
+
+
+SCENARIOS = {
+    "api_current": get("/api/v1/current/{city}"),
+    "api_forecast": get("/api/v1/forecast/{city}"),
+    "api_pollution": get("/api/v1/pollution/{city}"),
+    "weather_forecast": get("/weather/forecast/{city}"),
+    "weather_forecast_json": get("/weather/forecast/{city}?format=json"),
+    "weather_cities": get_cities("/weather/chart/cities"),
+    "users_items": users_items,
+    "users_login": users_login,
+}
+
+
+async def signup(client) -> dict:
+    credentials = {
+        "login": f"bench-{uuid.uuid4().hex}@example.com",
+        "password": "Bench_pas5",
+    }
+    response = await client.post("/users/signup", json=credentials)
+    response.raise_for_status()
+    return {"token": response.json()["access_token"], "credentials": credentials}
+
+
+async def run_scenario(client, name: str, requests: int, concurrency: int) -> dict:
+    run = SCENARIOS[name]()
+    user = await signup(client) if name.startswith("users_") else None
+    latencies = []
+    errors = 0
+    remaining = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while next(remaining) < requests:
+            started = time.perf_counter()
+            try:
+                response = await run(client, user)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentiles[49] * 1000, 2),
+        "p95_ms": round(percentiles[94] * 1000, 2),
+        "p99_ms": round(percentiles[98] * 1000, 2),
+    }
+
+
+def regressions(name: str, result: dict, baseline: dict, tolerance: float) -> list:
+    failed = []
+    if result["errors"]:
+        failed.append(f"{result['errors']} errors")
+    base = baseline.get(name)
+    if base is None:
+        return failed
+    tolerance = base.get("tolerance", tolerance)
+    if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+        failed.append(f"p95 {result['p95_ms']} ms > {base['p95_ms']} ms")
+    if result["rps"] < base["rps"] * (1 - tolerance):
+        failed.append(f"rps {result['rps']} < {base['rps']}")
+    return failed
+
+
+async def run(args) -> dict:
+    import main
+
+    fakes.install(args.latency, args.geocode_latency)
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=60
+    ) as client:
+        for name in args.scenarios:
+            # Warm caches and the render pool, then measure the steady state
+            await run_scenario(client, name, args.warmup, args.concurrency)
+            runs = [
+                await run_scenario(client, name, args.requests, args.concurrency)
+                for _ in range(args.runs)
+            ]
+            results[name] = median_result(runs)
+    return results
+
+
+def median_result(runs: list) -> dict:
+    """
+    Median of every figure over the runs, a single slow run does not move it
+    """
+    result = {
+        key: round(statistics.median(i[key] for i in runs), 2)
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+    }
+    result["requests"] = sum(i["requests"] for i in runs)
+    result["errors"] = sum(i["errors"] for i in runs)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--warmup", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--geocode-latency", type=float, default=0.2)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failed = False
+    print(
+        f"{'scenario':<22} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  result"
+    )
+    for name, result in results.items():
+        problems = regressions(name, result, baseline, args.tolerance)
+        failed = failed or bool(problems)
+        print(
+            f"{name:<22} {result['rps']:>8} {result['p50_ms']:>8} "
+            f"{result['p95_ms']:>8} {result['p99_ms']:>8}  {'; '.join(problems) or 'ok'}"
+        )
+
+    if args.update:
+        for name, result in results.items():
+            if "tolerance" in baseline.get(name, {}):
+                result["tolerance"] = baseline[name]["tolerance"]
+            baseline[name] = result
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved: {args.baseline}")
+        return
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Compile a GeoNames style TSV into the memory mapped gazetteer index
+
+    python scripts/build_gazetteer.py
+    python scripts/build_gazetteer.py cities15000.txt data/gazetteer.idx --min-population 15000
+
+data/cities.tsv is a small starter set of major cities. For full coverage
+use cities500.txt / cities15000.txt or allCountries.txt from
+https://download.geonames.org/export/dump/. The app builds the index from
+GAZETTEER_SOURCE on startup when GAZETTEER_PATH is missing.
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services import gazetteer
+from settings import Settings
+
+settings = Settings()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", nargs="?", default=settings.GAZETTEER_SOURCE)
+    parser.add_argument("path", nargs="?", default=settings.GAZETTEER_PATH)
+    parser.add_argument("--min-population", type=int, default=0)
+    args = parser.parse_args()
+    names = gazetteer.build(args.source, args.path, args.min_population)
+    print(f"{args.path}: {names} names, {os.path.getsize(args.path)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Startup time and RSS of a fresh web worker for every app profile
+
+    python scripts/startup_report.py --max-seconds 2 --max-rss-mb 150
+
+Every run imports main.py in a new interpreter. The best of --runs is reported.
+Exit code is 1 when a threshold is exceeded or a heavy chart module
+(numpy, plotly) was imported at startup.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODE = "import json, main; print(json.dumps(main.startup_report()))"
+
+
+def measure(profile: str) -> dict:
+    env = dict(os.environ, APP_PROFILE=profile)
+    result = subprocess.run(
+        [sys.executable, "-c", CODE],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=["full", "api"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float)
+    parser.add_argument("--max-rss-mb", type=float)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'profile':<8} {'import s':>9} {'rss MB':>8}  heavy modules")
+    for profile in args.profiles:
+        runs = [measure(profile) for _ in range(args.runs)]
+        seconds = min(i["import_seconds"] for i in runs)
+        rss = min(i["max_rss_mb"] for i in runs)
+        heavy = runs[0]["heavy_modules"]
+        print(f"{profile:<8} {seconds:>9.3f} {rss:>8.1f}  {', '.join(heavy) or '-'}")
+        if heavy:
+            failed = True
+        if args.max_seconds is not None and seconds > args.max_seconds:
+            failed = True
+        if args.max_rss_mb is not None and rss > args.max_rss_mb:
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
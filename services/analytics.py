@@ -0,0 +1,60 @@
+"""
+Small vectorized helpers for chart series, plain NumPy arrays in and out
+"""
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+def timestamps(dates: Sequence[str]) -> np.ndarray:
+    """
+    "YYYY-MM-DD HH:MM:SS" strings (OpenWeather dt_txt) to unix seconds
+    """
+    return np.asarray(dates, dtype="datetime64[s]").astype(np.int64)
+
+
+def linear_trend(
+    x: Sequence[float], y: Sequence[float]
+) -> Tuple[float, float, np.ndarray]:
+    """
+    Ordinary least squares line y = slope * x + intercept
+    Return slope, intercept and the fitted values at x
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) < 2:
+        return 0.0, float(y[0]) if len(y) else 0.0, y.copy()
+    # Center x: unix timestamps are large and would hurt conditioning
+    offset = x.mean()
+    design = np.column_stack([x - offset, np.ones_like(x)])
+    (slope, intercept), *_ = np.linalg.lstsq(design, y, rcond=None)
+    intercept -= slope * offset
+    return float(slope), float(intercept), slope * x + intercept
+
+
+def windows(y: Sequence[float], window: int) -> np.ndarray:
+    """
+    Trailing windows of `y`, one row per point
+    The first window - 1 rows are padded with the first value
+    """
+    y = np.asarray(y, dtype=np.float64)
+    window = max(1, min(window, len(y)))
+    padded = np.concatenate([np.full(window - 1, y[0]), y]) if len(y) else y
+    return np.lib.stride_tricks.sliding_window_view(padded, window)
+
+
+def rolling_mean(y: Sequence[float], window: int) -> np.ndarray:
+    if not len(y):
+        return np.asarray(y, dtype=np.float64)
+    return windows(y, window).mean(axis=1)
+
+
+def rolling_band(y: Sequence[float], window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rolling minimum and maximum of `y`
+    """
+    if not len(y):
+        empty = np.asarray(y, dtype=np.float64)
+        return empty, empty
+    rows = windows(y, window)
+    return rows.min(axis=1), rows.max(axis=1)
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+from services import compression, metrics
+from settings import Settings
+
+settings = Settings()
+
+logger_artifacts = logging.getLogger(__name__)
+logger_artifacts.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_artifacts.addHandler(handler)
+
+last_eviction = 0.0
+
+
+def chart_key(version: int, chart: str, *args) -> str:
+    """
+    Content address of a chart: builder name and version plus its input data
+    """
+    data = json.dumps([version, chart, args], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+
+def chart_path(key: str, ext: str = "html") -> str:
+    return os.path.join(settings.CHART_CACHE_DIR, f"{key}.{ext}")
+
+
+def hit(path: str) -> bool:
+    """
+    Check a rendered chart exists and mark it as recently used
+    """
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        metrics.cache_result("chart", "miss")
+        return False
+    metrics.cache_result("chart", "hit")
+    return True
+
+
+def compressed(path: str, encoding: str) -> str:
+    """
+    Path of the encoded variant of a chart, compressed on first use and
+    kept next to it so the eviction ages it like any other artifact
+    """
+    variant = f"{path}.{compression.SUFFIXES[encoding]}"
+    try:
+        os.utime(variant)
+    except FileNotFoundError:
+        compression.write_compressed(path, variant, encoding)
+    return variant
+
+
+def evict(max_bytes: int = None, max_age: float = None) -> int:
+    """
+    Delete charts older than max_age, then least recently used charts
+    until the directory fits into max_bytes. Return the number of deleted files
+    Temp files of writes older than RENDER_TIMEOUT are left by terminated
+    render workers and deleted too
+    """
+    max_bytes = settings.CHART_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age = settings.CHART_CACHE_MAX_AGE if max_age is None else max_age
+    now = time.time()
+    files = []
+    orphans = []
+    with os.scandir(settings.CHART_CACHE_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if not entry.name.startswith("."):
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+            elif (
+                entry.name.endswith(".tmp")
+                and now - stat.st_mtime > settings.RENDER_TIMEOUT
+            ):
+                orphans.append(entry.path)
+    deleted = 0
+    for path in orphans:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        deleted += 1
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    for mtime, size, path in files:
+        if total <= max_bytes and now - mtime <= max_age:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        deleted += 1
+    if deleted:
+        logger_artifacts.info(f"Evicted charts: {deleted} | kept bytes: {total}")
+    return deleted
+
+
+def maybe_evict():
+    """
+    Evict at most once per CHART_CACHE_EVICT_INTERVAL seconds per process
+    """
+    global last_eviction
+    now = time.monotonic()
+    if now - last_eviction < settings.CHART_CACHE_EVICT_INTERVAL:
+        return 0
+    last_eviction = now
+    return evict()
@@ -0,0 +1,104 @@
+import importlib.util
+import logging
+import mimetypes
+import os
+import sys
+from importlib.metadata import version
+
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+
+from services import compression
+from settings import Settings
+
+settings = Settings()
+
+PLOTLY_VERSION = version("plotly")
+PLOTLY_DIR = os.path.join(
+    os.path.dirname(importlib.util.find_spec("plotly").origin), "package_data"
+)
+# Versioned prefix: a plotly upgrade changes the url, so the file can be cached forever
+PLOTLY_PREFIX = f"/static/plotly/{PLOTLY_VERSION}"
+PLOTLY_JS_URL = f"{PLOTLY_PREFIX}/plotly.min.js"
+# Assets served compressed, stored once per version in ASSET_CACHE_DIR
+PRECOMPRESSED = ("plotly.min.js",)
+
+logger_assets = logging.getLogger(__name__)
+logger_assets.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_assets.addHandler(handler)
+
+
+def variant_path(name: str, encoding: str) -> str:
+    suffix = compression.SUFFIXES[encoding]
+    return os.path.join(
+        settings.ASSET_CACHE_DIR, f"plotly-{PLOTLY_VERSION}-{name}.{suffix}"
+    )
+
+
+def precompress():
+    """
+    Write the missing compressed variants of PRECOMPRESSED assets, run at
+    startup off the event loop. Until a variant exists its asset is
+    compressed per response by CompressionMiddleware
+    """
+    try:
+        os.makedirs(settings.ASSET_CACHE_DIR, exist_ok=True)
+        for name in PRECOMPRESSED:
+            for encoding in compression.ENCODINGS:
+                target = variant_path(name, encoding)
+                if not os.path.exists(target):
+                    compression.write_compressed(
+                        os.path.join(PLOTLY_DIR, name), target, encoding
+                    )
+                    logger_assets.info(f"Precompressed asset: {target}")
+    except OSError as e:
+        logger_assets.warning(f"Asset precompression failed: {e!r}")
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles for immutable, versioned assets, serves the precompressed
+    variant of an asset when the client accepts its encoding
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        name = os.path.basename(full_path)
+        if name in PRECOMPRESSED:
+            accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+            encoding = compression.negotiate(accept_encoding)
+            if encoding is not None:
+                variant = variant_path(name, encoding)
+                try:
+                    full_path, stat_result = variant, os.stat(variant)
+                except FileNotFoundError:
+                    encoding = None
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if name in PRECOMPRESSED:
+            response.headers["vary"] = "Accept-Encoding"
+            if encoding is not None:
+                # The variant file has its own ETag and Last-Modified
+                response.headers["content-encoding"] = encoding
+                response.headers["content-type"] = mimetypes.guess_type(name)[0]
+        response.headers["cache-control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+def plotly_static() -> CachedStaticFiles:
+    return CachedStaticFiles(directory=PLOTLY_DIR)
+
+
+def include_plotlyjs():
+    """
+    `include_plotlyjs` value for write_html from CHART_PLOTLYJS:
+    static = script tag to the locally served bundle, cdn = plotly cdn,
+    inline = full bundle embedded into every chart
+    """
+    if settings.CHART_PLOTLYJS == "inline":
+        return True
+    if settings.CHART_PLOTLYJS == "cdn":
+        return "cdn"
+    return PLOTLY_JS_URL
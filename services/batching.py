@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+
+class MicroBatch:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.items = {}
+        self.timer = None
+
+
+class MicroBatcher:
+    """
+    Collect concurrent single item loads of the same group for up to `window`
+    seconds and run them as one `load(group, items)` call of at most `size` items
+    load returns a dict item -> result, items missing from it raise KeyError
+    """
+
+    def __init__(
+        self,
+        load: Callable[[Hashable, List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        size: int,
+        window: float,
+    ):
+        self.load = load
+        self.size = size
+        self.window = window
+        self._batches = {}
+        self._tasks = set()
+
+    async def get(self, group: Hashable, item: Hashable) -> Any:
+        loop = asyncio.get_running_loop()
+        batch = self._batches.get(group)
+        if batch is None or batch.loop is not loop:
+            batch = MicroBatch(loop)
+            batch.timer = loop.call_later(self.window, self._dispatch, group, batch)
+            self._batches[group] = batch
+        future = batch.items.get(item)
+        if future is None:
+            future = loop.create_future()
+            # Mark the exception as retrieved when every caller was cancelled
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+            batch.items[item] = future
+            if len(batch.items) >= self.size:
+                batch.timer.cancel()
+                self._dispatch(group, batch)
+        # One caller going away must not fail the others of the batch
+        return await asyncio.shield(future)
+
+    def _dispatch(self, group: Hashable, batch: MicroBatch):
+        if self._batches.get(group) is batch:
+            del self._batches[group]
+        task = batch.loop.create_task(self._run(group, batch.items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, group: Hashable, items: Dict[Hashable, asyncio.Future]):
+        try:
+            results = await self.load(group, list(items))
+        except asyncio.CancelledError:
+            for future in items.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in items.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for item, future in items.items():
+            if future.done():
+                continue
+            if item in results:
+                future.set_result(results[item])
+            else:
+                future.set_exception(KeyError(item))
@@ -0,0 +1,193 @@
+"""
+Plotly chart builders, run inside the render process pool
+Every builder takes plain data and returns a figure, `write_*` saves it
+plotly/numpy are imported inside the builders, so web workers that only
+pass builders to the pool never load them
+"""
+import os
+import tempfile
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Bump when a builder changes its output, cached charts are keyed by it
+VERSION = 2
+
+# Forecast slots are 3 hours apart, 8 slots = 1 day
+ROLLING_WINDOW = 8
+TREND_COLOR = "#636efa"
+
+
+def write_atomic(path: str, write) -> str:
+    """
+    Call write(file) on a unique temp file next to `path`, then rename it,
+    readers never see a partial chart and concurrent renders never share a file
+    """
+    # Dot prefix: eviction and static lookups skip files being written
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), prefix=".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+def write_html(path: str, include_plotlyjs, builder, *args) -> str:
+    """
+    Build a figure and atomically write it as html to `path`
+    """
+    fig = builder(*args)
+    return write_atomic(
+        path, lambda f: fig.write_html(f, include_plotlyjs=include_plotlyjs)
+    )
+
+
+def write_json(path: str, builder, *args) -> str:
+    """
+    Build a figure and atomically write its plotly json to `path`
+    """
+    fig = builder(*args)
+    return write_atomic(path, fig.write_json)
+
+
+def current_table(temp_data: list) -> "go.Figure":
+    import plotly.graph_objects as go
+
+    columns = list(temp_data[0])
+    fig = go.Figure(
+        data=[
+            go.Table(
+                header=dict(values=columns, fill_color="paleturquoise", align="left"),
+                cells=dict(
+                    values=[[row[i] for row in temp_data] for i in columns],
+                    fill_color="lavender",
+                    align="left",
+                ),
+            )
+        ]
+    )
+    return fig
+
+
+def forecast(city: str, data: dict) -> "go.Figure":
+    """
+    Forecast points with a least squares trendline
+    The daily rolling mean and min/max band are available from the legend
+    """
+    import plotly.graph_objects as go
+
+    from services import analytics
+
+    dates = data["date"]
+    temperature = data["temperature"]
+    _, _, trend = analytics.linear_trend(analytics.timestamps(dates), temperature)
+    mean = analytics.rolling_mean(temperature, ROLLING_WINDOW)
+    low, high = analytics.rolling_band(temperature, ROLLING_WINDOW)
+    fig = go.Figure(
+        data=[
+            go.Scatter(
+                x=dates,
+                y=temperature,
+                mode="markers",
+                name="temperature",
+                marker_color=TREND_COLOR,
+                showlegend=False,
+            ),
+            go.Scatter(
+                x=dates,
+                y=trend,
+                mode="lines",
+                name="trend",
+                line_color=TREND_COLOR,
+                showlegend=False,
+            ),
+            go.Scatter(
+                x=dates, y=high, mode="lines", name="daily max", visible="legendonly"
+            ),
+            go.Scatter(
+                x=dates,
+                y=low,
+                mode="lines",
+                name="daily min",
+                fill="tonexty",
+                visible="legendonly",
+            ),
+            go.Scatter(
+                x=dates, y=mean, mode="lines", name="daily mean", visible="legendonly"
+            ),
+        ]
+    )
+    fig.update_layout(
+        title=f"Weather forecast for next 5 days for: {city}",
+        xaxis_title="date",
+        yaxis_title="temperature",
+        legend_tracegroupgap=0,
+    )
+    return fig
+
+
+def cities_bar(data: dict, title: str) -> "go.Figure":
+    import plotly.graph_objects as go
+
+    fig = go.Figure(
+        data=[
+            go.Bar(x=[city], y=[temperature], name=city)
+            for city, (_, _, temperature) in data.items()
+        ]
+    )
+    fig.update_layout(
+        title=title,
+        xaxis_title="city",
+        yaxis_title="temperature",
+        legend_title="city",
+        barmode="relative",
+    )
+    return fig
+
+
+def cities_map(data: dict, title: str) -> "go.Figure":
+    import plotly.graph_objects as go
+
+    # Same marker scaling as plotly express: area mode, largest marker 20px
+    largest = max(max(i[2] for i in data.values()), 1e-9)
+    fig = go.Figure(
+        data=[
+            go.Scattergeo(
+                lat=[latitude],
+                lon=[longitude],
+                name=city,
+                hovertext=[city],
+                marker=dict(
+                    size=[max(temperature, 0)],
+                    sizemode="area",
+                    sizeref=2.0 * largest / 20**2,
+                ),
+            )
+            for city, (latitude, longitude, temperature) in data.items()
+        ]
+    )
+    fig.update_geos(projection_type="natural earth")
+    fig.update_layout(title=title or None, legend_title="city")
+    return fig
+
+
+def pollution(city_name: str, data: list) -> "go.Figure":
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    dates = [i["date"] for i in data]
+    fig = make_subplots(rows=2, cols=2, subplot_titles=("CO", "NO2", "O3", "SO2"))
+    fig.add_trace(go.Scatter(x=dates, y=[i["CO"] for i in data]), row=1, col=1)
+    fig.add_trace(go.Scatter(x=dates, y=[i["NO2"] for i in data]), row=1, col=2)
+    fig.add_trace(go.Scatter(x=dates, y=[i["O3"] for i in data]), row=2, col=1)
+    fig.add_trace(go.Scatter(x=dates, y=[i["SO2"] for i in data]), row=2, col=2)
+    fig.update_layout(
+        height=700, width=1400, title_text=f"Air pollution forecast for {city_name}"
+    )
+    return fig
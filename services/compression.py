@@ -0,0 +1,197 @@
+import gzip
+import os
+import tempfile
+import zlib
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from settings import Settings
+
+try:
+    import brotli
+except ImportError:  # gzip only without the optional brotli package
+    brotli = None
+
+settings = Settings()
+
+# Supported encodings, most preferred first, and artifact file suffixes
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+SUFFIXES = {"br": "br", "gzip": "gz"}
+
+COMPRESSIBLE = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "image/svg+xml",
+)
+# Event streams are flushed per event by the client, leave them as they are
+INCOMPRESSIBLE = ("text/event-stream",)
+# Larger bodies and chunks are compressed in the threadpool, off the event loop
+INLINE_MAX_SIZE = 64 * 1024
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Best supported encoding of an Accept-Encoding header, None for identity
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    """
+    static: compressed once and served many times, use the best ratio
+    """
+    if encoding == "br":
+        quality = settings.BROTLI_STATIC_QUALITY if static else settings.BROTLI_QUALITY
+        return brotli.compress(data, quality=quality)
+    level = settings.GZIP_STATIC_LEVEL if static else settings.GZIP_LEVEL
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def write_compressed(source: str, target: str, encoding: str):
+    """
+    Compress a file once for serving many times, written next to the target
+    and renamed so concurrent writers and readers never see a partial file
+    """
+    with open(source, "rb") as f:
+        data = compress(f.read(), encoding, static=True)
+    directory = os.path.dirname(os.path.abspath(target))
+    # Dot prefix: eviction and static lookups skip files being written
+    fd, temp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(temp, target)
+
+
+async def run(fn, data: bytes, *args) -> bytes:
+    if len(data) < INLINE_MAX_SIZE:
+        return fn(data, *args)
+    return await run_in_threadpool(fn, data, *args)
+
+
+def weak_etag(headers: MutableHeaders):
+    """
+    An encoded body is another representation, its ETag can not stay strong
+    """
+    etag = headers.get("etag")
+    if etag is not None and not etag.startswith("W/"):
+        headers["etag"] = f"W/{etag}"
+
+
+def compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return (
+        "content-encoding" not in headers
+        and content_type.startswith(COMPRESSIBLE)
+        and not content_type.startswith(INCOMPRESSIBLE)
+    )
+
+
+class StreamCompressor:
+    """
+    Incremental compressor, every chunk is flushed so streamed
+    records reach the client without waiting for the next ones
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(
+                settings.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+            )
+
+    def chunk(self, data: bytes, last: bool) -> bytes:
+        if self.encoding == "br":
+            end = self._compressor.finish if last else self._compressor.flush
+            return self._compressor.process(data) + end()
+        flush = zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(flush)
+
+
+class CompressionMiddleware:
+    """
+    Compress text and JSON responses with br or gzip, as the client accepts
+    Complete bodies under COMPRESSION_MIN_SIZE bytes and responses that
+    already set Content-Encoding (precompressed artifacts) pass unchanged,
+    compressed bodies get a weak ETag
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start = None
+        compressor = None
+
+        async def send_wrapper(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                # Wait for the first body chunk, it tells whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                first, start = start, None
+                headers = MutableHeaders(raw=first["headers"])
+                if not compressible(headers) or (
+                    not more_body and len(body) < settings.COMPRESSION_MIN_SIZE
+                ):
+                    await send(first)
+                    await send(message)
+                    return
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                weak_etag(headers)
+                if not more_body:
+                    body = await run(compress, body, encoding)
+                    headers["content-length"] = str(len(body))
+                    await send(first)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["content-length"]
+                compressor = StreamCompressor(encoding)
+                await send(first)
+            if compressor is None:
+                await send(message)
+                return
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": await run(compressor.chunk, body, not more_body),
+                    "more_body": more_body,
+                }
+            )
+
+        await self.app(scope, receive, send_wrapper)
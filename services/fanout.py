@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import sys
+from typing import AsyncIterator, Iterable, List, NamedTuple, Optional
+
+from fastapi import HTTPException
+
+from services import upstream
+from services.geocoding import Place, get_city, normalize
+from settings import Settings
+
+settings = Settings()
+
+logger_fanout = logging.getLogger(__name__)
+logger_fanout.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_fanout.addHandler(handler)
+
+
+class CityWeather(NamedTuple):
+    """
+    Current weather for one city of a list, `error` is set instead on failure
+    """
+
+    city: str
+    place: Optional[Place] = None
+    weather: Optional[dict] = None
+    error: Optional[str] = None
+
+
+def unique_cities(cities: Iterable[str]) -> List[str]:
+    """
+    Drop repeated city names (case and whitespace insensitive), keep order
+    """
+    seen = {}
+    for city in cities:
+        seen.setdefault(normalize(city), city)
+    return list(seen.values())
+
+
+async def current_weather(city: str, units: str = "metric") -> CityWeather:
+    try:
+        place = await get_city(city)
+        weather = await upstream.fetch_weather(
+            place.latitude, place.longitude, units, place.city_id
+        )
+    except HTTPException as e:
+        return CityWeather(city=city, error=e.detail)
+    except Exception as e:
+        logger_fanout.exception(f"City weather failed: {city} | {e!r}")
+        return CityWeather(city=city, error="Internal error")
+    return CityWeather(city=city, place=place, weather=weather)
+
+
+async def cities_weather(
+    cities: Iterable[str], units: str = "metric"
+) -> List[CityWeather]:
+    """
+    Geocode and fetch current weather for many cities concurrently
+    At most FANOUT_CONCURRENCY cities are in flight, results keep input order
+    """
+    semaphore = asyncio.Semaphore(settings.FANOUT_CONCURRENCY)
+
+    async def run(city):
+        async with semaphore:
+            return await current_weather(city, units)
+
+    return await asyncio.gather(*(run(city) for city in unique_cities(cities)))
+
+
+async def stream_cities_weather(
+    cities: Iterable[str], units: str = "metric"
+) -> AsyncIterator[CityWeather]:
+    """
+    Like cities_weather, but yield every city as soon as it resolves
+    At most FANOUT_CONCURRENCY cities are in flight whatever the list length,
+    the first result does not wait for the rest of the list
+    """
+    names = iter(unique_cities(cities))
+    running = set()
+    try:
+        while True:
+            for city in names:
+                running.add(asyncio.ensure_future(current_weather(city, units)))
+                if len(running) >= settings.FANOUT_CONCURRENCY:
+                    break
+            if not running:
+                return
+            done, running = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        # The client went away, drop the cities still in flight
+        for task in running:
+            task.cancel()
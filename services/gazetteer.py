@@ -0,0 +1,279 @@
+import bisect
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from typing import List, NamedTuple, Optional
+
+from settings import Settings
+
+settings = Settings()
+
+logger_gazetteer = logging.getLogger(__name__)
+logger_gazetteer.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_gazetteer.addHandler(handler)
+
+# Index file layout, little endian, sections 8 byte aligned:
+#   header   magic, places, keys and the offset of every section
+#   places   latitude f64, longitude f64, population u32, display name u32,
+#            GeoNames id u32 (OpenWeather city ids are GeoNames ids)
+#   hashes   u64 hash of every normalized name, sorted
+#   entries  place u32, name u32 for every hash
+#   sorted   entry u32 for every name in alphabetical order (prefix search)
+#   strings  u16 length + utf-8 bytes
+MAGIC = b"GAZ2"
+HEADER = struct.Struct("<4sIIIIIII")
+PLACE = struct.Struct("<ddIII")
+ENTRY = struct.Struct("<II")
+
+# GeoNames cities*.txt / allCountries.txt columns
+GEONAMEID, NAME, ASCIINAME, ALTERNATENAMES, LATITUDE, LONGITUDE = 0, 1, 2, 3, 4, 5
+FEATURE_CLASS, COUNTRY, POPULATION = 6, 8, 14
+
+
+class GazetteerPlace(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+    population: int
+    display_name: str
+    id: int
+
+
+def normalize(city: str) -> str:
+    return " ".join(city.casefold().split())
+
+
+def name_hash(key: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+    )
+
+
+def align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def build(source: str, path: str, min_population: int = 0) -> int:
+    """
+    Compile a GeoNames style TSV into an index file, return the number of names
+    Every name, ascii name and alternate name of a populated place is indexed,
+    a name shared by several places points to the most populated one
+    """
+    rows = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            row = line.rstrip("\n").split("\t")
+            if row[FEATURE_CLASS] != "P":
+                continue
+            population = int(row[POPULATION] or 0)
+            if population < min_population:
+                continue
+            rows.append((population, row))
+    rows.sort(key=lambda i: -i[0])
+
+    strings = bytearray()
+
+    def add_string(value: str) -> int:
+        offset = len(strings)
+        data = value.encode()[:65535]
+        strings.extend(struct.pack("<H", len(data)))
+        strings.extend(data)
+        return offset
+
+    places = bytearray()
+    names = {}
+    for index, (population, row) in enumerate(rows):
+        display_name = f"{row[NAME]}, {row[COUNTRY]}"
+        places.extend(
+            PLACE.pack(
+                float(row[LATITUDE]),
+                float(row[LONGITUDE]),
+                min(population, 2**32 - 1),
+                add_string(display_name),
+                int(row[GEONAMEID] or 0),
+            )
+        )
+        aliases = [row[NAME], row[ASCIINAME], *row[ALTERNATENAMES].split(",")]
+        for alias in aliases:
+            key = normalize(alias)
+            if key and key not in names:
+                names[key] = index
+
+    keys = sorted(names, key=name_hash)
+    hashes = bytearray()
+    entries = bytearray()
+    key_offsets = {}
+    for key in keys:
+        key_offsets[key] = add_string(key)
+        hashes.extend(struct.pack("<Q", name_hash(key)))
+        entries.extend(ENTRY.pack(names[key], key_offsets[key]))
+    position = {key: i for i, key in enumerate(keys)}
+    ordered = bytearray()
+    for key in sorted(names):
+        ordered.extend(struct.pack("<I", position[key]))
+
+    sections = [places, hashes, entries, ordered, strings]
+    offsets = []
+    offset = align(HEADER.size)
+    for section in sections:
+        offsets.append(offset)
+        offset = align(offset + len(section))
+    header = HEADER.pack(MAGIC, len(rows), len(keys), *offsets)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # Write next to the target and rename, workers may open it concurrently
+    fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(header)
+        for start, section in zip(offsets, sections):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(section)
+    os.replace(temp, path)
+    logger_gazetteer.info(f"Gazetteer built: {path} | places: {len(rows)}")
+    return len(keys)
+
+
+class Gazetteer:
+    """
+    Read only, memory mapped place index built by build()
+    Lookups hash the normalized name and binary search the sorted hashes
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        (
+            magic,
+            self.places,
+            self.keys,
+            places_offset,
+            hashes_offset,
+            entries_offset,
+            sorted_offset,
+            self._strings,
+        ) = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"Not a gazetteer index: {path}")
+        self._places = places_offset
+        self._entries = entries_offset
+        self._hashes = view[hashes_offset : hashes_offset + 8 * self.keys].cast("Q")
+        self._sorted = view[sorted_offset : sorted_offset + 4 * self.keys].cast("I")
+
+    def __len__(self):
+        return self.keys
+
+    def _string(self, offset: int) -> str:
+        start = self._strings + offset
+        (size,) = struct.unpack_from("<H", self._mmap, start)
+        return self._mmap[start + 2 : start + 2 + size].decode()
+
+    def _entry(self, index: int):
+        return ENTRY.unpack_from(self._mmap, self._entries + index * ENTRY.size)
+
+    def _place(self, index: int, name: str) -> GazetteerPlace:
+        latitude, longitude, population, display, id = PLACE.unpack_from(
+            self._mmap, self._places + index * PLACE.size
+        )
+        return GazetteerPlace(
+            name, latitude, longitude, population, self._string(display), id
+        )
+
+    def get(self, city: str) -> Optional[GazetteerPlace]:
+        key = normalize(city)
+        value = name_hash(key)
+        index = bisect.bisect_left(self._hashes, value)
+        while index < self.keys and self._hashes[index] == value:
+            place, name = self._entry(index)
+            if self._string(name) == key:
+                return self._place(place, key)
+            index += 1
+        return None
+
+    def prefix(
+        self, text: str, limit: int = 10, scan: int = 1000
+    ) -> List[GazetteerPlace]:
+        """
+        Places whose name starts with text, most populated first
+        At most scan names are looked at, short prefixes return a sample
+        """
+        key = normalize(text)
+        low, high = 0, self.keys
+        while low < high:
+            middle = (low + high) // 2
+            if self._string(self._entry(self._sorted[middle])[1]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = {}
+        for position in range(low, min(low + scan, self.keys)):
+            place, name = self._entry(self._sorted[position])
+            name = self._string(name)
+            if not name.startswith(key):
+                break
+            if place not in found:
+                found[place] = self._place(place, name)
+        return sorted(found.values(), key=lambda i: -i.population)[:limit]
+
+    def close(self):
+        self._hashes.release()
+        self._sorted.release()
+        self._mmap.close()
+
+
+index = None
+loaded = False
+
+
+def stale(path: str, source: str) -> bool:
+    if not os.path.exists(path):
+        return True
+    if os.path.getmtime(source) > os.path.getmtime(path):
+        return True
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) != MAGIC
+
+
+def get_index() -> Optional[Gazetteer]:
+    """
+    Open GAZETTEER_PATH once per process, build it from GAZETTEER_SOURCE
+    when only the source exists, the index has an older format or the
+    source was edited after the index was built. None when neither exists
+    """
+    global index, loaded
+    if loaded:
+        return index
+    loaded = True
+    path, source = settings.GAZETTEER_PATH, settings.GAZETTEER_SOURCE
+    if source and os.path.exists(source) and stale(path, source):
+        build(source, path)
+    if os.path.exists(path):
+        index = Gazetteer(path)
+        logger_gazetteer.info(f"Gazetteer loaded: {path} | names: {len(index)}")
+    else:
+        logger_gazetteer.warning(f"No gazetteer at {path}, geocoding uses Nominatim")
+    return index
+
+
+def lookup(city: str) -> Optional[GazetteerPlace]:
+    current = get_index()
+    return None if current is None else current.get(city)
+
+
+def search(text: str, limit: int = 10) -> List[GazetteerPlace]:
+    """
+    Places whose name starts with text, [] without an index
+    """
+    current = get_index()
+    return [] if current is None else current.prefix(text, limit)
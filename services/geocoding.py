@@ -0,0 +1,121 @@
+import logging
+import sys
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from geopy.exc import GeopyError
+from geopy.extra.rate_limiter import RateLimiter
+from geopy.geocoders import Nominatim
+
+from services import gazetteer, metrics, store
+from services.cache import MISSING, LRUCache
+from services.singleflight import SingleFlight
+from settings import Settings
+
+settings = Settings()
+
+geolocator = Nominatim(user_agent="weather_app")
+
+# Nominatim usage policy: at most ~1 request per second
+geocode = RateLimiter(
+    geolocator.geocode,
+    min_delay_seconds=settings.NOMINATIM_MIN_DELAY,
+    max_retries=0,
+    swallow_exceptions=False,
+)
+
+logger_geocoding = logging.getLogger(__name__)
+logger_geocoding.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_geocoding.addHandler(handler)
+
+
+class Place(NamedTuple):
+    """
+    Cached geocode result, same attributes the routers read from geopy Location
+    city_id: OpenWeather city id, known for gazetteer places only
+    """
+
+    latitude: float
+    longitude: float
+    raw: dict
+    city_id: Optional[int] = None
+
+
+places = LRUCache(settings.GEOCODE_CACHE_SIZE)
+flights = SingleFlight()
+
+
+normalize = gazetteer.normalize
+
+
+async def get_city(city: str) -> Place:
+    """
+    Geocode a city name: in-process LRU -> local gazetteer -> redis -> Nominatim
+    Unknown cities are cached too and raise 404
+    Concurrent misses for the same name share one lookup
+    """
+    key = normalize(city)
+    place = places.get(key)
+    if place is MISSING:
+        local = gazetteer.lookup(key)
+        if local is not None:
+            metrics.cache_result("geocode", "local")
+            return Place(
+                latitude=local.latitude,
+                longitude=local.longitude,
+                raw={"display_name": local.display_name},
+                city_id=local.id or None,
+            )
+        place = await flights.do(key, lookup, key)
+    else:
+        metrics.cache_result("geocode", "hit")
+    if place is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Cant find city: {city}"
+        )
+    return place
+
+
+async def lookup(key: str):
+    cached = await store.get_json(f"geocode:{key}")
+    if cached is not MISSING:
+        metrics.cache_result("geocode", "hit")
+        place = None if cached is None else Place(**cached)
+    else:
+        metrics.cache_result("geocode", "miss")
+        place = await nominatim(key)
+        await store.set_json(
+            f"geocode:{key}", None if place is None else place._asdict(), ttl(place)
+        )
+    places.set(key, place, ttl(place))
+    return place
+
+
+async def nominatim(key: str):
+    logger_geocoding.info(f"Nominatim geocode: {key}")
+    try:
+        with metrics.timed(metrics.UPSTREAM_SECONDS, "nominatim", "geocode"):
+            location = await run_in_threadpool(geocode, key)
+    except GeopyError as e:
+        logger_geocoding.warning(f"Nominatim failed: {key} | {e!r}")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY, detail="Geocoder unavailable"
+        )
+    if location is None:
+        return None
+    return Place(
+        latitude=location.latitude,
+        longitude=location.longitude,
+        raw={"display_name": location.raw["display_name"]},
+    )
+
+
+def ttl(place) -> int:
+    if place is None:
+        return settings.GEOCODE_NEGATIVE_TTL
+    return settings.GEOCODE_TTL
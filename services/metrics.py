@@ -0,0 +1,212 @@
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# Gunicorn workers write to PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py)
+# and /metrics merges the files of all workers
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route",
+    ["method", "route", "status"],
+)
+UPSTREAM_SECONDS = Histogram(
+    "upstream_request_duration_seconds",
+    "OpenWeather and Nominatim call latency",
+    ["service", "endpoint", "outcome"],
+)
+RENDER_SECONDS = Histogram(
+    "chart_render_duration_seconds",
+    "Chart render latency in the render pool",
+    ["chart", "outcome"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Single database statement latency",
+)
+DB_REQUEST_QUERIES = Histogram(
+    "db_queries_per_request",
+    "Database statements run by one request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+DB_REQUEST_SECONDS = Histogram(
+    "db_seconds_per_request",
+    "Time one request spent in database statements",
+    ["route"],
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups by result, hit ratio = hit / (hit + miss)",
+    ["cache", "result"],
+)
+PASSWORD_SECONDS = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt call time in the password executor, utilization = "
+    "rate(sum) / PASSWORD_WORKERS per worker",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+PASSWORD_WAIT_SECONDS = Histogram(
+    "password_queue_wait_seconds",
+    "Time a hashing call waited for a free password executor thread",
+)
+PASSWORD_EVENTS = Counter(
+    "password_events_total",
+    "Rejected and rehashed logins, calls refused with 503 when the queue is full",
+    ["event"],
+)
+# Gauges of live workers only, summed over workers on /metrics
+PASSWORD_PENDING = Gauge(
+    "password_pending_calls",
+    "Hashing calls waiting or running in the password executor",
+    multiprocess_mode="livesum",
+)
+DB_POOL_EVENTS = Counter(
+    "db_pool_events_total",
+    "Async pool connects, checkouts and checkout timeouts",
+    ["event"],
+)
+DB_POOL_HELD_SECONDS = Histogram(
+    "db_pool_connection_held_seconds",
+    "Time a connection stayed checked out of the async pool, utilization = "
+    "rate(sum) / DB_POOL_SIZE per worker",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the async pool",
+    multiprocess_mode="livesum",
+)
+STARTUP_SECONDS = Gauge(
+    "app_startup_import_seconds",
+    "Import time of the app, one sample per live worker",
+    ["profile"],
+    multiprocess_mode="liveall",
+)
+STARTUP_MAX_RSS = Gauge(
+    "app_startup_max_rss_bytes",
+    "Peak RSS of the worker when startup completed",
+    ["profile"],
+    multiprocess_mode="liveall",
+)
+HEAVY_MODULES_LOADED = Gauge(
+    "app_heavy_modules_loaded",
+    "Chart stack modules imported by the worker at startup",
+    ["profile"],
+    multiprocess_mode="liveall",
+)
+
+# [statements, seconds] of the current request
+db_usage = ContextVar("db_usage", default=None)
+
+
+def cache_result(cache: str, result: str):
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+class timed:
+    """
+    Observe the duration of a block into a histogram,
+    outcome label is ok or error
+    """
+
+    def __init__(self, histogram: Histogram, *labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        outcome = "ok" if exc_type is None else "error"
+        self.histogram.labels(*self.labels, outcome).observe(
+            time.perf_counter() - self.started
+        )
+
+
+def before_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_query(conn, cursor, statement, parameters, context, executemany):
+    took = time.perf_counter() - conn.info["query_started"].pop()
+    DB_QUERY_SECONDS.observe(took)
+    usage = db_usage.get()
+    if usage is not None:
+        usage[0] += 1
+        usage[1] += took
+
+
+def route_path(scope) -> str:
+    """
+    Route template of a handled request, unmatched paths share one label
+    """
+    app = scope.get("app")
+    endpoint = scope.get("endpoint")
+    if app is None or endpoint is None:
+        return "unmatched"
+    paths = getattr(app.state, "route_paths", None)
+    if paths is None:
+        paths = {
+            getattr(route, "endpoint", getattr(route, "app", None)): route.path
+            for route in app.router.routes
+        }
+        app.state.route_paths = paths
+    return paths.get(endpoint, "unmatched")
+
+
+class MetricsMiddleware:
+    """
+    Record latency and database usage of every http request
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        usage = [0, 0.0]
+        token = db_usage.set(usage)
+        response = {"status": 500}
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            took = time.perf_counter() - started
+            db_usage.reset(token)
+            route = route_path(scope)
+            REQUEST_SECONDS.labels(scope["method"], route, response["status"]).observe(
+                took
+            )
+            DB_REQUEST_QUERIES.labels(route).observe(usage[0])
+            DB_REQUEST_SECONDS.labels(route).observe(usage[1])
+
+
+def latest() -> bytes:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
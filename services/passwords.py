@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from services import metrics
+from settings import Settings
+
+settings = Settings()
+
+# Hashes with other rounds than BCRYPT_ROUNDS are flagged for rehash on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+logger_passwords = logging.getLogger(__name__)
+logger_passwords.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_passwords.addHandler(handler)
+
+# bcrypt releases the GIL, so a thread pool keeps the event loop free
+executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_WORKERS, thread_name_prefix="bcrypt"
+)
+pending = 0
+
+
+async def run(kind: str, fn, *args):
+    """
+    Run a hashing call in the password executor
+    Raise 503 when PASSWORD_QUEUE_DEPTH calls are already waiting or running
+    """
+    global pending
+    if pending >= settings.PASSWORD_QUEUE_DEPTH:
+        metrics.PASSWORD_EVENTS.labels("busy").inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins, try again",
+        )
+    submitted = time.perf_counter()
+
+    def call():
+        begin = time.perf_counter()
+        result = fn(*args)
+        return result, begin - submitted, time.perf_counter() - begin
+
+    pending += 1
+    metrics.PASSWORD_PENDING.inc()
+    try:
+        loop = asyncio.get_running_loop()
+        result, waited, took = await loop.run_in_executor(executor, call)
+    finally:
+        pending -= 1
+        metrics.PASSWORD_PENDING.dec()
+    metrics.PASSWORD_WAIT_SECONDS.observe(waited)
+    metrics.PASSWORD_SECONDS.labels(kind).observe(took)
+    return result
+
+
+async def hash_password(password: str) -> str:
+    return await run("hash", pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password, return (valid, new hash)
+    The new hash is set when the stored one uses other rounds than BCRYPT_ROUNDS
+    """
+    valid, new_hash = await run(
+        "verify", pwd_context.verify_and_update, password, hashed
+    )
+    if not valid:
+        metrics.PASSWORD_EVENTS.labels("rejected").inc()
+    if new_hash is not None:
+        metrics.PASSWORD_EVENTS.labels("rehashed").inc()
+    return valid, new_hash
+
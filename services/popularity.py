@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import sys
+import time
+from collections import Counter
+from typing import List
+
+from redis.exceptions import RedisError
+
+from services import store, upstream
+from services.cache import MISSING
+from services.geocoding import get_city, normalize
+from settings import Settings
+
+settings = Settings()
+
+# Sorted set of normalized city name -> decayed lookup count
+KEY = "popular:cities"
+
+logger_popularity = logging.getLogger(__name__)
+logger_popularity.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_popularity.addHandler(handler)
+
+# Lookups counted in this worker since the last flush
+pending = Counter()
+last_flush = 0.0
+flushing = None
+
+
+def track(city: str):
+    """
+    Count a city lookup, counts are sent to redis in batches
+    at most once per POPULAR_FLUSH_INTERVAL seconds
+    """
+    global flushing, last_flush
+    pending[normalize(city)] += 1
+    now = time.monotonic()
+    if now - last_flush < settings.POPULAR_FLUSH_INTERVAL:
+        return
+    loop = asyncio.get_running_loop()
+    if flushing is None or flushing.done() or flushing.get_loop() is not loop:
+        last_flush = now
+        flushing = loop.create_task(flush())
+
+
+async def flush():
+    counts = dict(pending)
+    pending.clear()
+    try:
+        pipe = store.get_redis().pipeline(transaction=False)
+        for city, count in counts.items():
+            pipe.zincrby(KEY, count, city)
+        await pipe.execute()
+    except RedisError as e:
+        # Popularity is best effort, counts of a failed flush are dropped
+        logger_popularity.warning(f"Popularity flush failed: {e!r}")
+
+
+async def top(count: int = None) -> List[str]:
+    count = settings.POPULAR_TOP_N if count is None else count
+    cities = await store.get_redis().zrevrange(KEY, 0, count - 1)
+    return [i.decode() for i in cities]
+
+
+async def decay(factor: float = 0.5) -> int:
+    """
+    Multiply all counts by factor, then drop cities that faded out
+    and keep at most POPULAR_MAX_CITIES. Return the number of kept cities
+    """
+    redis = store.get_redis()
+    await redis.zunionstore(KEY, {KEY: factor})
+    await redis.zremrangebyscore(KEY, "-inf", settings.POPULAR_MIN_SCORE)
+    await redis.zremrangebyrank(KEY, 0, -settings.POPULAR_MAX_CITIES - 1)
+    return await redis.zcard(KEY)
+
+
+# Payloads the city endpoints read, units as the routers request them
+WARMED = (
+    ("weather", "metric"),
+    ("forecast", "metric"),
+    ("air_pollution/forecast", None),
+)
+
+
+async def expiring(key: str, endpoint: str) -> bool:
+    """
+    Check the shared cache entry is missing or expires within WARM_AHEAD seconds
+    """
+    entry = await store.get_json(key)
+    if entry is MISSING:
+        return True
+    return upstream.age(entry) > upstream.CACHE_TTL[endpoint] - settings.WARM_AHEAD
+
+
+async def warm_city(city: str) -> int:
+    """
+    Refresh current, forecast and pollution payloads of a city
+    that are about to expire. Return the number of refreshed payloads
+    """
+    place = await get_city(city)
+    lat, lon = upstream.round_coords(place.latitude, place.longitude)
+    refreshed = 0
+    for endpoint, units in WARMED:
+        key = upstream.cache_key(endpoint, lat, lon, units)
+        if await expiring(key, endpoint):
+            await upstream.flights.do(
+                key, upstream.refresh, key, endpoint, lat, lon, units, place.city_id
+            )
+            refreshed += 1
+    return refreshed
+
+
+async def warm(count: int = None) -> dict:
+    """
+    Refresh the payloads of the top cities before they expire
+    """
+    cities = await top(count)
+    semaphore = asyncio.Semaphore(settings.FANOUT_CONCURRENCY)
+
+    async def run(city):
+        async with semaphore:
+            try:
+                return await warm_city(city)
+            except Exception as e:
+                logger_popularity.warning(f"Warming failed: {city} | {e!r}")
+                return 0
+
+    refreshed = await asyncio.gather(*(run(i) for i in cities))
+    return {"cities": len(cities), "refreshed": sum(refreshed)}
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+from fastapi import HTTPException, status
+
+from services import metrics
+from settings import Settings
+
+settings = Settings()
+
+logger_render = logging.getLogger(__name__)
+logger_render.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_render.addHandler(handler)
+
+executor = None
+# Renders submitted and not finished yet, released from the pool threads
+pending = 0
+lock = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global executor
+    if executor is None:
+        # spawn: forking a worker with a running event loop and threads is unsafe
+        executor = ProcessPoolExecutor(
+            max_workers=settings.RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return executor
+
+
+def shutdown():
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=False)
+        executor = None
+
+
+def pool_processes(pool: ProcessPoolExecutor) -> list:
+    """
+    Worker processes of a pool, there is no public accessor for them
+    Relies on the CPython internal ProcessPoolExecutor._processes
+    (dict pid -> multiprocessing.Process in concurrent/futures/process.py,
+    3.8 to 3.12), and returns [] when it is missing or already cleared
+    """
+    processes = getattr(pool, "_processes", None)
+    if not isinstance(processes, dict):
+        logger_render.warning("Render pool processes not accessible")
+        return []
+    return list(processes.values())
+
+
+def recycle():
+    """
+    Terminate the pool workers so a hung render stops, the next render spawns
+    a new pool. Renders still running in the old pool fail with BrokenProcessPool
+    """
+    global executor
+    current, executor = executor, None
+    if current is None:
+        return
+    # ProcessPoolExecutor has no public way to stop a running job
+    for process in pool_processes(current):
+        process.terminate()
+    current.shutdown(wait=False)
+
+
+def release(job: Future):
+    global pending
+    with lock:
+        pending -= 1
+
+
+async def render(chart: Callable, *args):
+    """
+    Run a chart builder in the render process pool
+    Raise 503 when RENDER_QUEUE_DEPTH renders are already waiting or running
+    and 504 when a render takes longer than RENDER_TIMEOUT
+    """
+    global pending, executor
+    with lock:
+        if pending >= settings.RENDER_QUEUE_DEPTH:
+            logger_render.warning(f"Render queue is full: {chart.__name__}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Chart renderer is busy",
+            )
+        pending += 1
+    pool = get_executor()
+    try:
+        job = pool.submit(chart, *args)
+    except BrokenProcessPool:
+        release(None)
+        logger_render.error(f"Render pool is broken: {chart.__name__}")
+        executor = None
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Chart renderer is restarting",
+        )
+    # The slot is taken until the job ends in the pool, not when we stop waiting
+    job.add_done_callback(release)
+    try:
+        # write_html / write_json take the figure builder as an argument
+        builder = next((i for i in args if callable(i)), chart)
+        with metrics.timed(metrics.RENDER_SECONDS, builder.__name__):
+            return await asyncio.wait_for(
+                asyncio.wrap_future(job), settings.RENDER_TIMEOUT
+            )
+    except asyncio.TimeoutError:
+        logger_render.warning(f"Render timeout: {chart.__name__}, recycling pool")
+        recycle()
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Chart rendering timed out",
+        )
+    except BrokenProcessPool:
+        logger_render.error(f"Render pool is broken: {chart.__name__}")
+        if executor is pool:
+            executor = None
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Chart renderer is restarting",
+        )
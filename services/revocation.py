@@ -0,0 +1,160 @@
+"""
+Revoked tokens, stored in redis until the token expires
+
+Every web worker keeps a Bloom filter of revoked fingerprints, loaded from
+redis on startup and updated through a pub/sub channel. A token missing
+from the filter is not revoked and needs no redis round trip; a filter hit
+(revoked or false positive) is confirmed in redis. Until the filter is
+loaded every check goes to redis.
+"""
+import asyncio
+import hashlib
+import logging
+import sys
+import time
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+
+from services import store
+from settings import Settings
+
+settings = Settings()
+
+CHANNEL = "revoked"
+PREFIX = "revoked:"
+
+logger_revocation = logging.getLogger(__name__)
+logger_revocation.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_revocation.addHandler(handler)
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter over hex sha256 fingerprints
+    """
+
+    def __init__(self, size: int, hashes: int):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray((size + 7) // 8)
+
+    def _positions(self, fingerprint: str):
+        digest = bytes.fromhex(fingerprint)
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:16], "big") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, fingerprint: str):
+        for i in self._positions(fingerprint):
+            self.bits[i >> 3] |= 1 << (i & 7)
+
+    def __contains__(self, fingerprint: str) -> bool:
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self._positions(fingerprint))
+
+
+def new_filter() -> BloomFilter:
+    return BloomFilter(settings.REVOCATION_BLOOM_BITS, settings.REVOCATION_BLOOM_HASHES)
+
+
+bloom = new_filter()
+bloom_ready = False
+sync_task = None
+
+
+def fingerprint(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def revoke(token: str, expires: float):
+    """
+    Revoke a token until its own `expires` claim
+    """
+    ttl = int(expires - time.time()) + 1
+    if ttl <= 0:
+        return
+    key = fingerprint(token)
+    redis = store.get_redis()
+    try:
+        await redis.set(f"{PREFIX}{key}", 1, ex=ttl)
+        await redis.publish(CHANNEL, key)
+    except RedisError as e:
+        logger_revocation.error(f"Token revoke failed: {e!r}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Token store unavailable",
+        )
+    bloom.add(key)
+
+
+async def is_revoked(token: str) -> bool:
+    key = fingerprint(token)
+    if bloom_ready and key not in bloom:
+        return False
+    try:
+        return bool(await store.get_redis().exists(f"{PREFIX}{key}"))
+    except RedisError as e:
+        logger_revocation.error(f"Token check failed: {e!r}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Token store unavailable",
+        )
+
+
+async def sync():
+    """
+    Load revoked fingerprints into the Bloom filter and follow new revocations
+    The filter is rebuilt every REVOCATION_REBUILD_INTERVAL seconds to drop
+    expired tokens
+    """
+    global bloom, bloom_ready
+    while True:
+        pubsub = None
+        try:
+            redis = store.get_redis()
+            # Subscribe before loading, a revocation during the scan is buffered
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(CHANNEL)
+            fresh = new_filter()
+            async for key in redis.scan_iter(match=f"{PREFIX}*", count=1000):
+                fresh.add(key.decode()[len(PREFIX) :])
+            bloom = fresh
+            bloom_ready = True
+            rebuild_at = time.monotonic() + settings.REVOCATION_REBUILD_INTERVAL
+            while time.monotonic() < rebuild_at:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is not None:
+                    bloom.add(message["data"].decode())
+        except (RedisError, OSError) as e:
+            bloom_ready = False
+            logger_revocation.warning(f"Revocation sync failed: {e!r}")
+            await asyncio.sleep(5)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.reset()
+                except (RedisError, OSError):
+                    pass
+
+
+def start():
+    global sync_task
+    sync_task = asyncio.create_task(sync())
+
+
+async def stop():
+    global sync_task, bloom_ready
+    bloom_ready = False
+    if sync_task is not None:
+        sync_task.cancel()
+        try:
+            await sync_task
+        except asyncio.CancelledError:
+            pass
+        sync_task = None
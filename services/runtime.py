@@ -0,0 +1,31 @@
+import asyncio
+
+
+class LoopLocal:
+    """
+    Lazily build a loop-bound resource (http client, redis connection, ...)
+    and rebuild it when the running event loop changes.
+    TestClient runs every request in a fresh loop, so a single
+    module-level instance would outlive the loop it was created in.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._loop = None
+        self._value = None
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        if self._value is None or self._loop is not loop:
+            self._value = self._factory()
+            self._loop = loop
+        return self._value
+
+    def reset(self):
+        """
+        Forget the current instance and return it so the caller can close it
+        """
+        value = self._value
+        self._value = None
+        self._loop = None
+        return value
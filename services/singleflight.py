@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one in-flight task
+    Every caller awaits the same task and shares its result or exception
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._running(key) is not None
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable], *args) -> Any:
+        task = self._running(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # One caller going away (client disconnect) must not cancel the others
+        return await asyncio.shield(task)
+
+    def _running(self, key: Hashable):
+        task = self._calls.get(key)
+        if task is None or task.done():
+            return None
+        if task.get_loop() is not asyncio.get_running_loop():
+            return None
+        return task
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every caller was cancelled
+            task.exception()
@@ -0,0 +1,66 @@
+import json
+import logging
+import sys
+from typing import Any
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from services.cache import MISSING
+from services.runtime import LoopLocal
+from settings import Settings
+
+settings = Settings()
+
+logger_store = logging.getLogger(__name__)
+logger_store.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_store.addHandler(handler)
+
+
+def _build_redis() -> aioredis.Redis:
+    return aioredis.from_url(
+        settings.REDIS_URL,
+        socket_timeout=settings.REDIS_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_TIMEOUT,
+    )
+
+
+redis_client = LoopLocal(_build_redis)
+
+
+def get_redis() -> aioredis.Redis:
+    return redis_client.get()
+
+
+async def close_redis():
+    current = redis_client.reset()
+    if current is not None:
+        await current.close(close_connection_pool=True)
+
+
+async def get_json(key: str) -> Any:
+    """
+    Read a cached JSON value, MISSING on miss or when redis is unavailable
+    """
+    try:
+        value = await get_redis().get(key)
+    except RedisError as e:
+        logger_store.warning(f"Redis get failed: {key} | {e!r}")
+        return MISSING
+    if value is None:
+        return MISSING
+    return json.loads(value)
+
+
+async def set_json(key: str, value: Any, ttl: float):
+    """
+    Store a JSON value with expiry, failures are logged and ignored
+    """
+    try:
+        await get_redis().set(key, json.dumps(value), ex=max(int(ttl), 1))
+    except RedisError as e:
+        logger_store.warning(f"Redis set failed: {key} | {e!r}")
@@ -0,0 +1,70 @@
+"""
+Pending item transfers, stored in redis until the transfer link is
+redeemed or expires
+
+A bulk transfer may list ITEMS_BATCH_SIZE items, too many for a token in a
+url. The items are stored under a random id and the link token carries only
+that id, the recipient and the expiry. Redeeming removes the transfer,
+so every link moves items once.
+"""
+import json
+import logging
+import secrets
+import sys
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+
+from services import store
+from settings import Settings
+
+settings = Settings()
+
+PREFIX = "transfer:"
+
+logger_transfers = logging.getLogger(__name__)
+logger_transfers.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_transfers.addHandler(handler)
+
+
+def unavailable(e: Exception) -> HTTPException:
+    logger_transfers.error(f"Transfer store failed: {e!r}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Transfer store unavailable",
+    )
+
+
+async def create(sender: int, items: List[int]) -> str:
+    """
+    Store a pending transfer for TRANSFER_TTL seconds, return its id
+    """
+    transfer_id = secrets.token_urlsafe(16)
+    value = json.dumps({"sender": sender, "items": items})
+    try:
+        await store.get_redis().set(
+            f"{PREFIX}{transfer_id}", value, ex=settings.TRANSFER_TTL
+        )
+    except RedisError as e:
+        raise unavailable(e)
+    return transfer_id
+
+
+async def take(transfer_id: str) -> Optional[dict]:
+    """
+    Read and delete a pending transfer {"sender", "items"} in one step,
+    None when unknown, expired or already redeemed
+    """
+    key = f"{PREFIX}{transfer_id}"
+    try:
+        # GET + DEL in MULTI, GETDEL needs redis 6.2
+        async with store.get_redis().pipeline(transaction=True) as pipe:
+            value, _ = await pipe.get(key).delete(key).execute()
+    except RedisError as e:
+        raise unavailable(e)
+    return None if value is None else json.loads(value)
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import sys
+import time
+from typing import Optional
+
+import httpx
+from fastapi import HTTPException, status
+
+from services import metrics, store
+from services.batching import MicroBatcher
+from services.cache import MISSING, LRUCache
+from services.runtime import LoopLocal
+from services.singleflight import SingleFlight
+from settings import Settings
+
+settings = Settings()
+
+OPEN_WEATHER_URL = "https://api.openweathermap.org/data/2.5"
+
+logger_upstream = logging.getLogger(__name__)
+logger_upstream.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+format = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+handler.setFormatter(format)
+logger_upstream.addHandler(handler)
+
+
+def _build_client(
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=OPEN_WEATHER_URL,
+        transport=transport,
+        params={"appid": settings.OPEN_WEATHER_KEY},
+        timeout=httpx.Timeout(
+            settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+client = LoopLocal(_build_client)
+
+
+async def start_client():
+    """
+    Open the shared OpenWeather connection pool
+    """
+    client.get()
+
+
+async def close_client():
+    """
+    Close the shared OpenWeather connection pool
+    """
+    current = client.reset()
+    if current is not None:
+        await current.aclose()
+
+
+async def fetch(endpoint: str, timeout: Optional[float] = None, **params) -> dict:
+    """
+    GET an OpenWeather endpoint through the shared pool
+    Optional[timeout]: overrides HTTP_TIMEOUT for this call
+    """
+    try:
+        with metrics.timed(metrics.UPSTREAM_SECONDS, "openweather", endpoint):
+            response = await client.get().get(
+                f"/{endpoint}",
+                params=params,
+                timeout=httpx.USE_CLIENT_DEFAULT if timeout is None else timeout,
+            )
+            response.raise_for_status()
+    except httpx.TimeoutException:
+        logger_upstream.warning(f"OpenWeather timeout: {endpoint} {params}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="OpenWeather timeout",
+        )
+    except httpx.HTTPStatusError as e:
+        logger_upstream.warning(
+            f"OpenWeather error: {endpoint} {params} | {e.response.status_code}"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"OpenWeather error: {e.response.status_code}",
+        )
+    except httpx.TransportError as e:
+        logger_upstream.warning(f"OpenWeather unavailable: {endpoint} | {e!r}")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="OpenWeather unavailable",
+        )
+    return response.json()
+
+
+# Seconds a payload is served as fresh, per endpoint
+CACHE_TTL = {
+    "weather": settings.CACHE_TTL_WEATHER,
+    "forecast": settings.CACHE_TTL_FORECAST,
+    "air_pollution/forecast": settings.CACHE_TTL_POLLUTION,
+}
+
+responses = LRUCache(settings.RESPONSE_CACHE_SIZE)
+flights = SingleFlight()
+refreshing = {}
+
+
+async def fetch_group(units: Optional[str], city_ids: list) -> dict:
+    """
+    Current weather of up to 20 cities in one call, by OpenWeather city id
+    """
+    params = {"id": ",".join(str(i) for i in city_ids)}
+    if units is not None:
+        params["units"] = units
+    payload = await fetch("group", **params)
+    return {i["id"]: i for i in payload["list"]}
+
+
+# OpenWeather rejects group calls of more than 20 ids
+GROUP_MAX_SIZE = 20
+
+# Concurrent current weather misses of cities with a known id share group calls
+groups = MicroBatcher(
+    fetch_group,
+    min(settings.GROUP_BATCH_SIZE, GROUP_MAX_SIZE),
+    settings.GROUP_BATCH_WINDOW,
+)
+
+
+def cache_key(endpoint: str, lat: float, lon: float, units: Optional[str]) -> str:
+    return f"owm:{endpoint}:{lat}:{lon}:{units or '-'}"
+
+
+def round_coords(lat: float, lon: float):
+    precision = settings.CACHE_COORD_PRECISION
+    return round(lat, precision), round(lon, precision)
+
+
+async def cached_fetch(
+    endpoint: str,
+    lat: float,
+    lon: float,
+    units: Optional[str] = None,
+    city_id: Optional[int] = None,
+) -> dict:
+    """
+    Fetch an OpenWeather payload through the response cache
+    Fresh entries are returned as is, entries up to CACHE_STALE seconds
+    past their ttl are returned while a background refresh runs
+    Concurrent misses for the same key share one upstream call,
+    current weather misses of cities with a city_id are batched
+    """
+    lat, lon = round_coords(lat, lon)
+    key = cache_key(endpoint, lat, lon, units)
+    ttl = CACHE_TTL[endpoint]
+    entry = responses.get(key)
+    if entry is MISSING or age(entry) > ttl:
+        shared = await store.get_json(key)
+        if shared is not MISSING and (
+            entry is MISSING or shared["fetched_at"] > entry["fetched_at"]
+        ):
+            entry = shared
+            remember(key, entry, ttl)
+    if entry is not MISSING:
+        if age(entry) <= ttl:
+            metrics.cache_result("openweather", "hit")
+            return entry["payload"]
+        if age(entry) <= ttl + settings.CACHE_STALE:
+            metrics.cache_result("openweather", "stale")
+            revalidate(key, endpoint, lat, lon, units, city_id)
+            return entry["payload"]
+    metrics.cache_result("openweather", "miss")
+    entry = await flights.do(key, refresh, key, endpoint, lat, lon, units, city_id)
+    return entry["payload"]
+
+
+async def refresh(
+    key: str,
+    endpoint: str,
+    lat: float,
+    lon: float,
+    units: Optional[str],
+    city_id: Optional[int] = None,
+) -> dict:
+    payload = None
+    if endpoint == "weather" and city_id is not None and settings.GROUP_BATCH_SIZE > 1:
+        try:
+            payload = await groups.get(units, city_id)
+        except KeyError:
+            # The id is unknown to OpenWeather, ask by coordinates
+            logger_upstream.info(f"City id not in group response: {city_id}")
+        except HTTPException as e:
+            # A failed group call must not fail every city of the batch
+            logger_upstream.warning(
+                f"Group call failed, fetching by coordinates: {city_id} | {e.detail}"
+            )
+    if payload is None:
+        params = {"lat": lat, "lon": lon}
+        if units is not None:
+            params["units"] = units
+        payload = await fetch(endpoint, **params)
+    entry = {"fetched_at": time.time(), "payload": payload}
+    ttl = CACHE_TTL[endpoint]
+    remember(key, entry, ttl)
+    await store.set_json(key, entry, ttl + settings.CACHE_STALE)
+    return entry
+
+
+def revalidate(
+    key: str,
+    endpoint: str,
+    lat: float,
+    lon: float,
+    units: Optional[str],
+    city_id: Optional[int] = None,
+):
+    """
+    Refresh a stale entry in the background, at most once at a time per key
+    """
+    if key in refreshing:
+        return
+
+    async def run():
+        try:
+            await flights.do(key, refresh, key, endpoint, lat, lon, units, city_id)
+        except Exception as e:
+            logger_upstream.warning(f"Background refresh failed: {key} | {e!r}")
+        finally:
+            refreshing.pop(key, None)
+
+    refreshing[key] = asyncio.create_task(run())
+
+
+def remember(key: str, entry: dict, ttl: float):
+    remaining = ttl + settings.CACHE_STALE - age(entry)
+    if remaining > 0:
+        responses.set(key, entry, remaining)
+
+
+def age(entry: dict) -> float:
+    return time.time() - entry["fetched_at"]
+
+
+async def fetch_weather(
+    lat: float, lon: float, units: str = "metric", city_id: Optional[int] = None
+) -> dict:
+    return await cached_fetch("weather", lat, lon, units, city_id)
+
+
+async def fetch_forecast(lat: float, lon: float, units: str = "metric") -> dict:
+    return await cached_fetch("forecast", lat, lon, units)
+
+
+async def fetch_pollution(lat: float, lon: float) -> dict:
+    return await cached_fetch("air_pollution/forecast", lat, lon)
@@ -8,5 +8,104 @@ class Settings(BaseSettings):
     ALGORITHM:str
     BACKEND_URL: str
 
+    # full = all routers, api = JSON only routers (users + api)
+    APP_PROFILE: str = "full"
+
+    # Database pool, per engine and per worker, times in seconds
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Item listing, export streams rows from the db in chunks
+    ITEMS_PAGE_SIZE: int = 50
+    ITEMS_MAX_PAGE_SIZE: int = 500
+    ITEMS_EXPORT_CHUNK: int = 500
+    # Items per bulk create, delete or transfer request
+    ITEMS_BATCH_SIZE: int = 1000
+    # Seconds a transfer link stays valid
+    TRANSFER_TTL: int = 300
+
+    # Password hashing, 2**BCRYPT_ROUNDS bcrypt iterations
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_WORKERS: int = 2
+    PASSWORD_QUEUE_DEPTH: int = 64
+
+    # Verified tokens cached per worker
+    AUTH_CACHE_SIZE: int = 10000
+
+    # Token revocation, bloom filter of 2**20 bits fits ~100k tokens at ~1% fp
+    REVOCATION_BLOOM_BITS: int = 2 ** 20
+    REVOCATION_BLOOM_HASHES: int = 7
+    REVOCATION_REBUILD_INTERVAL: int = 600
+
+    # OpenWeather http client
+    HTTP_TIMEOUT: float = 10.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+
+    REDIS_TIMEOUT: float = 0.5
+
+    # Geocoding cache, ttl in seconds
+    GEOCODE_CACHE_SIZE: int = 4096
+    GEOCODE_TTL: int = 30 * 24 * 3600
+    GEOCODE_NEGATIVE_TTL: int = 24 * 3600
+    NOMINATIM_MIN_DELAY: float = 1.0
+    # Local place index, built from the GeoNames style source when missing
+    GAZETTEER_PATH: str = "data/gazetteer.idx"
+    GAZETTEER_SOURCE: str = "data/cities.tsv"
+
+    # OpenWeather response cache, ttl in seconds
+    RESPONSE_CACHE_SIZE: int = 2048
+    CACHE_TTL_WEATHER: int = 600
+    CACHE_TTL_FORECAST: int = 3600
+    CACHE_TTL_POLLUTION: int = 3600
+    CACHE_STALE: int = 600
+    CACHE_COORD_PRECISION: int = 2
+    # Current weather misses collected for GROUP_BATCH_WINDOW seconds are
+    # fetched GROUP_BATCH_SIZE (capped at 20) cities per call, 1 disables batching
+    GROUP_BATCH_SIZE: int = 20
+    GROUP_BATCH_WINDOW: float = 0.01
+
+    # Popular cities, counts halve every POPULAR_HALF_LIFE seconds
+    POPULAR_TOP_N: int = 50
+    POPULAR_MAX_CITIES: int = 1000
+    POPULAR_MIN_SCORE: float = 0.5
+    POPULAR_HALF_LIFE: int = 3600
+    POPULAR_FLUSH_INTERVAL: float = 5.0
+    # Cache warming runs every WARM_INTERVAL seconds and refreshes payloads
+    # expiring within WARM_AHEAD seconds, keep WARM_AHEAD > WARM_INTERVAL
+    WARM_INTERVAL: int = 60
+    WARM_AHEAD: int = 120
+
+    # Multi-city endpoints
+    FANOUT_CONCURRENCY: int = 10
+
+    # Chart rendering process pool, timeout in seconds
+    RENDER_WORKERS: int = 2
+    RENDER_QUEUE_DEPTH: int = 16
+    RENDER_TIMEOUT: float = 30.0
+
+    # Rendered chart cache, age in seconds
+    CHART_CACHE_DIR: str = "stats"
+    CHART_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    CHART_CACHE_MAX_AGE: int = 3600
+    CHART_CACHE_EVICT_INTERVAL: int = 60
+    # static | cdn | inline, how chart html loads plotly.js
+    CHART_PLOTLYJS: str = "static"
+
+    # Response compression, brotli needs the optional brotli package
+    COMPRESSION_MIN_SIZE: int = 1024
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 5
+    # Levels for chart artifacts, compressed once and served many times
+    GZIP_STATIC_LEVEL: int = 9
+    BROTLI_STATIC_QUALITY: int = 11
+    # Compressed variants of static assets, kept across restarts
+    ASSET_CACHE_DIR: str = "static_cache"
+
     class Config:
-        env_file = ".env"
\ No newline at end of file
+        env_file = ".env"
@@ -0,0 +1,148 @@
+import os
+from collections import Counter
+
+import pytest
+
+from services import store
+from services.cache import MISSING
+
+
+@pytest.fixture(scope="session", autouse=True)
+def offline_upstream():
+    """
+    OpenWeather and Nominatim are served from tests/fixtures,
+    LIVE_UPSTREAM=1 runs the tests against the real services
+    """
+    if os.environ.get("LIVE_UPSTREAM") != "1":
+        from tests.fakes import install
+
+        install()
+    yield
+
+
+@pytest.fixture
+def shared_store(monkeypatch):
+    """
+    In-memory stand-in for the redis json tier of services.store,
+    returns the dict of stored values by key
+    """
+    shared = {}
+
+    async def get_json(key):
+        return shared.get(key, MISSING)
+
+    async def set_json(key, value, ttl):
+        shared[key] = value
+
+    monkeypatch.setattr(store, "get_json", get_json)
+    monkeypatch.setattr(store, "set_json", set_json)
+    return shared
+
+
+class FakePipeline:
+    """
+    Queue commands and run them in order on execute, like a redis pipeline
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        results = []
+        for name, args, kwargs in self.commands:
+            results.append(await getattr(self.redis, name)(*args, **kwargs))
+        self.commands = []
+        return results
+
+
+class FakeRedis:
+    """
+    In-memory subset of redis.asyncio used by the services
+    keys: value by key, ttls: ex by key, scores: sorted sets {member: score},
+    published: (channel, message), calls: number of reads per command
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.ttls = {}
+        self.scores = {}
+        self.published = []
+        self.calls = Counter()
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def set(self, key, value, ex=None):
+        self.keys[key] = value
+        self.ttls[key] = ex
+
+    async def get(self, key):
+        self.calls["get"] += 1
+        return self.keys.get(key)
+
+    async def exists(self, key):
+        self.calls["exists"] += 1
+        return int(key in self.keys)
+
+    async def delete(self, key):
+        self.ttls.pop(key, None)
+        return int(self.keys.pop(key, None) is not None)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    async def zincrby(self, key, amount, member):
+        scores = self.scores.setdefault(key, {})
+        scores[member] = scores.get(member, 0) + amount
+
+    async def zrevrange(self, key, start, end):
+        scores = self.scores.get(key, {})
+        ranked = sorted(scores, key=lambda i: -scores[i])
+        return [i.encode() for i in ranked[start : end + 1]]
+
+    async def zunionstore(self, dest, keys):
+        union = {}
+        for key, weight in keys.items():
+            for member, score in self.scores.get(key, {}).items():
+                union[member] = union.get(member, 0) + score * weight
+        self.scores[dest] = union
+
+    async def zremrangebyscore(self, key, low, high):
+        scores = self.scores.get(key, {})
+        self.scores[key] = {
+            i: j for i, j in scores.items() if not float(low) <= j <= float(high)
+        }
+
+    async def zremrangebyrank(self, key, start, end):
+        scores = self.scores.get(key, {})
+        ranked = sorted(scores, key=lambda i: scores[i])
+        end = len(ranked) + end if end < 0 else end
+        for member in ranked[start : end + 1]:
+            del scores[member]
+
+    async def zcard(self, key):
+        return len(self.scores.get(key, {}))
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    FakeRedis returned by services.store.get_redis
+    """
+    redis = FakeRedis()
+    monkeypatch.setattr(store, "get_redis", lambda: redis)
+    return redis
@@ -0,0 +1,116 @@
+"""
+Offline stand-ins for OpenWeather and Nominatim
+
+Recorded payloads live in tests/fixtures. install() points services.upstream
+and services.geocoding at the fakes, optionally with an injected latency,
+so tests and scripts/benchmark.py run without network access.
+"""
+import asyncio
+import copy
+import json
+import os
+import re
+import time
+from collections import Counter
+from functools import partial
+from types import SimpleNamespace
+
+import httpx
+
+from services import geocoding, upstream
+from services.runtime import LoopLocal
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load(name: str):
+    with open(os.path.join(FIXTURES, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FakeOpenWeather:
+    """
+    httpx transport handler serving recorded OpenWeather payloads
+    latency: seconds added to every call
+    """
+
+    payloads = {
+        "weather": load("weather"),
+        "forecast": load("forecast"),
+        "air_pollution/forecast": load("air_pollution_forecast"),
+    }
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        endpoint = request.url.path.split("/data/2.5/", 1)[-1]
+        self.calls[endpoint] += 1
+        if endpoint == "group":
+            return httpx.Response(200, json=self.group(request.url.params))
+        payload = self.payloads.get(endpoint)
+        if payload is None:
+            return httpx.Response(404, json={"cod": "404", "message": "Not found"})
+        if endpoint == "weather":
+            payload = copy.deepcopy(payload)
+            payload["coord"] = {
+                "lat": float(request.url.params["lat"]),
+                "lon": float(request.url.params["lon"]),
+            }
+        return httpx.Response(200, json=payload)
+
+    def group(self, params) -> dict:
+        # Group entries are current weather payloads without base, cod, timezone
+        entries = []
+        for city_id in params["id"].split(","):
+            entry = copy.deepcopy(self.payloads["weather"])
+            for key in ("base", "cod", "timezone"):
+                entry.pop(key)
+            entry["id"] = int(city_id)
+            entries.append(entry)
+        return {"cnt": len(entries), "list": entries}
+
+
+class FakeNominatim:
+    """
+    Drop-in for the rate limited geopy geocode call, unknown names return None
+    latency: seconds added to every call, it runs in the threadpool like geopy
+    """
+
+    places = load("nominatim")
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+
+    def __call__(self, query: str):
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls[query] += 1
+        # Nominatim ignores punctuation, ("london",) finds London
+        place = self.places.get(geocoding.normalize(re.sub(r"[^\w\s]", " ", query)))
+        if place is None:
+            return None
+        return SimpleNamespace(
+            latitude=place["lat"],
+            longitude=place["lon"],
+            raw={"display_name": place["display_name"]},
+        )
+
+
+def install(latency: float = 0.0, geocode_latency: float = 0.0):
+    """
+    Route upstream calls to the fakes and drop cached payloads and places
+    Return (open_weather, nominatim) to inspect their call counters
+    """
+    open_weather = FakeOpenWeather(latency)
+    nominatim = FakeNominatim(geocode_latency)
+    transport = httpx.MockTransport(open_weather)
+    upstream.client = LoopLocal(partial(upstream._build_client, transport))
+    geocoding.geocode = nominatim
+    upstream.responses.clear()
+    geocoding.places.clear()
+    return open_weather, nominatim
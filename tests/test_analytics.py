@@ -0,0 +1,52 @@
+import numpy as np
+
+import pytest
+
+from services import analytics
+
+
+def test_linear_trend_matches_polyfit():
+    """
+    WHEN a trendline is fitted on forecast like timestamps
+    THEN check it matches numpy polyfit
+    """
+    x = analytics.timestamps(
+        [f"2022-11-0{1 + i // 8} {3 * (i % 8):02d}:00:00" for i in range(40)]
+    )
+    y = np.sin(np.arange(40) / 4) * 5 + np.arange(40) * 0.1
+    slope, intercept, fitted = analytics.linear_trend(x, y)
+    expected_slope, expected_intercept = np.polyfit(x.astype(float), y, 1)
+    assert slope == pytest.approx(expected_slope)
+    assert fitted == pytest.approx(expected_slope * x + expected_intercept)
+
+
+def test_linear_trend_short_series():
+    """
+    WHEN a trendline is fitted on a single point
+    THEN check a flat line is returned
+    """
+    slope, intercept, fitted = analytics.linear_trend([10], [3.5])
+    assert slope == 0.0
+    assert intercept == 3.5
+    assert list(fitted) == [3.5]
+
+
+def test_rolling_mean_and_band():
+    """
+    WHEN rolling stats are computed
+    THEN check trailing windows with the first value as padding
+    """
+    y = [1, 3, 2, 6, 4]
+    assert list(analytics.rolling_mean(y, 3)) == pytest.approx([1, 5 / 3, 2, 11 / 3, 4])
+    low, high = analytics.rolling_band(y, 3)
+    assert list(low) == [1, 1, 1, 2, 2]
+    assert list(high) == [1, 3, 3, 6, 6]
+
+
+def test_rolling_window_longer_than_series():
+    """
+    WHEN the window is longer than the series
+    THEN check it is clipped to the series length
+    """
+    assert list(analytics.rolling_mean([2, 4], 10)) == [2, 3]
+    assert len(analytics.rolling_mean([], 3)) == 0
@@ -1,4 +1,5 @@
 import datetime 
+import json
 
 from fastapi.testclient import TestClient
 
@@ -44,4 +45,101 @@ def test_pollution_city(city):
     response = client.get(f"/api/v1/pollution/{city}")
     response_body = response.json()
     assert len(response_body) > 5
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def test_current_cities_stream():
+    """
+    WHEN POST "/api/v1/current" with a city list requested
+    THEN check one NDJSON record per city, unknown cities carry an error
+    """
+    names = [city for city, in test_data_cities]
+    cities = {"cities": [{"name": i} for i in names + ["Atlantis"]]}
+    response = client.post("/api/v1/current", json=cities)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = {i["city"]: i for i in map(json.loads, response.text.splitlines())}
+    assert set(records) == set(names) | {"Atlantis"}
+    assert "error" in records.pop("Atlantis")
+    assert all("temperature" in i["weather"] for i in records.values())
+
+
+def test_current_cities_events():
+    """
+    WHEN GET "/api/v1/current?city=..." requested as text/event-stream
+    THEN check one server-sent event per city
+    """
+    params = [("city", city) for city, in test_data_cities]
+    response = client.get(
+        "/api/v1/current", params=params, headers={"accept": "text/event-stream"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [i for i in response.text.split("\n\n") if i]
+    assert len(events) == len(test_data_cities)
+    assert all(i.startswith("data: {") for i in events)
+
+
+def test_series_fields_and_columns():
+    """
+    WHEN forecast and pollution are requested with fields and columns format
+    THEN check only the requested fields, one list per field
+    """
+    rows = client.get("/api/v1/forecast/london").json()
+    response = client.get(
+        "/api/v1/forecast/london", params={"fields": "temperature", "format": "columns"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"temperature": [i["temperature"] for i in rows]}
+    response = client.get("/api/v1/pollution/london", params={"fields": "NO2,date"})
+    assert list(response.json()[0]) == ["NO2", "date"]
+    response = client.get("/api/v1/current/london", params={"fields": "temperature"})
+    assert list(response.json()) == ["temperature"]
+
+
+def test_unknown_fields():
+    """
+    WHEN an unknown field or format is requested
+    THEN check the request is rejected
+    """
+    response = client.get("/api/v1/pollution/london", params={"fields": "PM10"})
+    assert response.status_code == 400
+    response = client.get("/api/v1/forecast/london", params={"format": "csv"})
+    assert response.status_code == 422
+
+
+def test_city_autocomplete():
+    """
+    WHEN "/api/v1/cities/autocomplete" is requested with a name prefix
+    THEN check gazetteer cities starting with it, most populated first
+    """
+    response = client.get(
+        "/api/v1/cities/autocomplete", params={"q": "LON", "limit": 1}
+    )
+    assert response.status_code == 200
+    assert [i["display_name"] for i in response.json()] == ["London, GB"]
+    assert response.json()[0]["id"] == 2643743
+    response = client.get("/api/v1/cities/autocomplete", params={"q": "zzz"})
+    assert response.json() == []
+    response = client.get("/api/v1/cities/autocomplete", params={"q": ""})
+    assert response.status_code == 422
+
+
+def test_current_schema_is_projection():
+    """
+    WHEN the OpenAPI schema of "/api/v1/current/{city}" is read
+    THEN check no field is promised, ?fields= may leave any of them out
+    """
+    schema = client.get("/openapi.json").json()
+    ok = schema["paths"]["/api/v1/current/{city}"]["get"]["responses"]["200"]
+    ref = ok["content"]["application/json"]["schema"]["$ref"]
+    model = schema["components"]["schemas"][ref.rsplit("/", 1)[-1]]
+    assert "required" not in model
+    assert set(model["properties"]) == {
+        "place",
+        "today",
+        "temperature",
+        "wind",
+        "description",
+        "humidity",
+        "pressure",
+    }
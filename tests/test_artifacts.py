@@ -0,0 +1,108 @@
+import gzip
+import os
+import time
+
+import pytest
+
+from services import artifacts, charts
+
+
+@pytest.fixture
+def chart_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts.settings, "CHART_CACHE_DIR", str(tmp_path))
+    (tmp_path / ".gitignore").write_text("*")
+    return tmp_path
+
+
+def write_chart(chart_dir, name, size, age):
+    path = chart_dir / name
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_chart_key_depends_on_data():
+    """
+    WHEN chart keys are built from builder name and data
+    THEN check same input gives same key and other input another key
+    """
+    key = artifacts.chart_key(1, "forecast", "london", {"temperature": [1, 2]})
+    assert key == artifacts.chart_key(1, "forecast", "london", {"temperature": [1, 2]})
+    assert key != artifacts.chart_key(1, "forecast", "london", {"temperature": [1, 3]})
+    assert key != artifacts.chart_key(2, "forecast", "london", {"temperature": [1, 2]})
+
+
+def test_evict_least_recently_used(chart_dir):
+    """
+    WHEN charts take more than the disk budget
+    THEN check the oldest charts are deleted first
+    """
+    old = write_chart(chart_dir, "old.html", 100, 30)
+    used = write_chart(chart_dir, "used.html", 100, 20)
+    new = write_chart(chart_dir, "new.html", 100, 10)
+    assert artifacts.hit(str(used))
+    assert artifacts.evict(max_bytes=200, max_age=3600) == 1
+    assert not old.exists()
+    assert used.exists() and new.exists()
+    assert (chart_dir / ".gitignore").exists()
+
+
+def test_evict_expired(chart_dir):
+    """
+    WHEN charts are older than max age
+    THEN check they are deleted even within the disk budget
+    """
+    expired = write_chart(chart_dir, "expired.html", 10, 7200)
+    fresh = write_chart(chart_dir, "fresh.html", 10, 10)
+    assert artifacts.evict(max_bytes=10 ** 6, max_age=3600) == 1
+    assert not expired.exists()
+    assert fresh.exists()
+
+
+def test_evict_orphaned_temp_files(chart_dir, monkeypatch):
+    """
+    WHEN a terminated render left its temp file behind
+    THEN check it is deleted once older than RENDER_TIMEOUT, a running write is kept
+    """
+    monkeypatch.setattr(artifacts.settings, "RENDER_TIMEOUT", 30.0)
+    orphan = write_chart(chart_dir, ".abc123.tmp", 10, 60)
+    writing = write_chart(chart_dir, ".def456.tmp", 10, 1)
+    assert artifacts.evict(max_bytes=10 ** 6, max_age=3600) == 1
+    assert not orphan.exists()
+    assert writing.exists()
+    assert (chart_dir / ".gitignore").exists()
+
+
+def test_compressed_variant_is_reused(chart_dir):
+    """
+    WHEN the gzip variant of a chart is requested twice
+    THEN check it is written once next to the chart and decodes to it
+    """
+    path = write_chart(chart_dir, "chart.html", 10000, 0)
+    variant = artifacts.compressed(str(path), "gzip")
+    assert variant == f"{path}.gz"
+    assert gzip.decompress(open(variant, "rb").read()) == path.read_bytes()
+    os.utime(variant, (0, 0))
+    assert artifacts.compressed(str(path), "gzip") == variant
+    assert os.path.getmtime(variant) > 0
+
+
+def test_chart_written_atomically(chart_dir):
+    """
+    WHEN a chart is written, and a builder fails while writing
+    THEN check the file is complete and no temp file is left behind
+    """
+    pytest.importorskip("plotly")
+    path = str(chart_dir / "table.json")
+    charts.write_json(path, charts.current_table, [{"city": "London", "temp": 1}])
+    with open(path) as f:
+        assert '"London"' in f.read()
+
+    def broken(f):
+        f.write("{")
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        charts.write_atomic(str(chart_dir / "broken.json"), broken)
+    assert sorted(os.listdir(chart_dir)) == [".gitignore", "table.json"]
@@ -0,0 +1,80 @@
+import asyncio
+
+from fastapi import HTTPException
+
+import jwt
+import pytest
+
+from routers import auth
+
+
+@pytest.fixture
+def not_revoked(monkeypatch):
+    revoked = set()
+
+    async def is_revoked(token):
+        return token in revoked
+
+    monkeypatch.setattr(auth.revocation, "is_revoked", is_revoked)
+    auth.tokens.clear()
+    yield revoked
+    auth.tokens.clear()
+
+
+def test_token_claims_have_user_id(not_revoked):
+    """
+    WHEN a token is signed for a user
+    THEN check the user id is read from the token
+    """
+    token = auth.signJWT("user_test@example.com", 42)["access_token"]
+    user = asyncio.run(auth.current_user(token))
+    assert user.id == 42
+    assert user.login == "user_test@example.com"
+
+
+def test_verified_token_is_cached(not_revoked, monkeypatch):
+    """
+    WHEN the same token is used twice
+    THEN check it is decoded once
+    """
+    token = auth.signJWT("user_test@example.com", 42)["access_token"]
+    calls = []
+    decode = auth.decodeJWT
+    monkeypatch.setattr(auth, "decodeJWT", lambda t: calls.append(t) or decode(t))
+    asyncio.run(auth.current_user(token))
+    asyncio.run(auth.current_user(token))
+    assert len(calls) == 1
+
+
+def test_revoked_cached_token(not_revoked):
+    """
+    WHEN a cached token is revoked
+    THEN check it is rejected
+    """
+    token = auth.signJWT("user_test@example.com", 42)["access_token"]
+    asyncio.run(auth.current_user(token))
+    not_revoked.add(token)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(auth.current_user(token))
+    assert e.value.status_code == 401
+
+
+def test_token_without_user_id(not_revoked):
+    """
+    WHEN a token without the id claim is used
+    THEN check it is rejected
+    """
+    token = auth.transferJWT("user_test@example.com")
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(auth.current_user(token))
+    assert e.value.status_code == 401
+
+
+def test_bad_signature(not_revoked):
+    """
+    WHEN a token signed with another secret is used
+    THEN check it is rejected
+    """
+    token = jwt.encode({"user_id": "x", "id": 1, "expires": 1e12}, "other", "HS256")
+    with pytest.raises(HTTPException):
+        asyncio.run(auth.current_user(token))
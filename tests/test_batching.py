@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from services.batching import MicroBatcher
+
+
+@pytest.fixture
+def loads():
+    return []
+
+
+@pytest.fixture
+def batcher(loads):
+    async def load(group, items):
+        loads.append((group, items))
+        await asyncio.sleep(0.01)
+        if "broken" in items:
+            raise RuntimeError("upstream down")
+        return {i: f"{group}:{i}" for i in items if i != "unknown"}
+
+    return MicroBatcher(load, size=3, window=0.01)
+
+
+def test_concurrent_items_share_a_load(batcher, loads):
+    """
+    WHEN items of two groups are requested concurrently
+    THEN check one load per group, repeated items are loaded once
+    """
+
+    async def run():
+        return await asyncio.gather(
+            batcher.get("metric", 1),
+            batcher.get("metric", 2),
+            batcher.get("imperial", 1),
+            batcher.get("metric", 1),
+        )
+
+    results = asyncio.run(run())
+    assert results == ["metric:1", "metric:2", "imperial:1", "metric:1"]
+    assert sorted(loads) == [("imperial", [1]), ("metric", [1, 2])]
+
+
+def test_full_batch_is_split(batcher, loads):
+    """
+    WHEN more items than the batch size are requested
+    THEN check loads of at most size items
+    """
+
+    async def run():
+        return await asyncio.gather(*(batcher.get("metric", i) for i in range(7)))
+
+    assert asyncio.run(run()) == [f"metric:{i}" for i in range(7)]
+    assert [items for _, items in loads] == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_missing_and_failed_items(batcher):
+    """
+    WHEN an item is missing from the load result or the load fails
+    THEN check KeyError for the missing item, the error for the whole batch
+    """
+
+    async def run():
+        return await asyncio.gather(
+            batcher.get("metric", "known"),
+            batcher.get("metric", "unknown"),
+            batcher.get("imperial", "broken"),
+            batcher.get("imperial", "other"),
+            return_exceptions=True,
+        )
+
+    known, unknown, broken, other = asyncio.run(run())
+    assert known == "metric:known"
+    assert isinstance(unknown, KeyError)
+    assert isinstance(broken, RuntimeError) and other is broken
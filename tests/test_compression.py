@@ -0,0 +1,128 @@
+import gzip
+import zlib
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from services import compression
+
+BODY = "weather " * 1000
+
+
+async def text(request):
+    return PlainTextResponse(BODY, headers={"etag": '"body"'})
+
+
+async def large(request):
+    return PlainTextResponse(BODY * 100)
+
+
+async def small(request):
+    return PlainTextResponse("ok")
+
+
+async def encoded(request):
+    return Response(
+        gzip.compress(BODY.encode()),
+        media_type="text/html",
+        headers={"content-encoding": "gzip"},
+    )
+
+
+async def stream(request):
+    async def lines():
+        for i in range(3):
+            yield f'{{"line": {i}}}\n'
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+app = Starlette(
+    routes=[
+        Route("/text", text),
+        Route("/large", large),
+        Route("/small", small),
+        Route("/encoded", encoded),
+        Route("/stream", stream),
+    ]
+)
+app.add_middleware(compression.CompressionMiddleware)
+client = TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0.5, br", "br" if compression.brotli else "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", compression.ENCODINGS[0]),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_negotiate(header, expected):
+    """
+    WHEN Accept-Encoding headers are negotiated
+    THEN check the preferred supported encoding with a non zero weight
+    """
+    assert compression.negotiate(header) == expected
+
+
+def test_large_body_is_compressed():
+    """
+    WHEN a body over the threshold is requested with and without gzip
+    THEN check it is compressed only when the client accepts it
+    """
+    response = client.get("/text", headers={"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"body"'
+    assert int(response.headers["content-length"]) < len(BODY) / 10
+    assert response.text == BODY
+    response = client.get("/text", headers={"accept-encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"body"'
+    response = client.get("/large", headers={"accept-encoding": "gzip"})
+    assert response.text == BODY * 100
+
+
+def test_small_and_encoded_bodies_pass():
+    """
+    WHEN a small body or an already encoded body is requested
+    THEN check they are sent unchanged
+    """
+    response = client.get("/small", headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    response = client.get("/encoded", headers={"accept-encoding": "gzip"})
+    assert response.text == BODY
+
+
+def test_stream_is_compressed():
+    """
+    WHEN a streamed response is requested with gzip
+    THEN check it is compressed without a content length
+    """
+    response = client.get("/stream", headers={"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.splitlines() == ['{"line": 0}', '{"line": 1}', '{"line": 2}']
+
+
+@pytest.mark.parametrize("encoding", compression.ENCODINGS)
+def test_stream_chunks_are_flushed(encoding):
+    """
+    WHEN chunks go through a stream compressor
+    THEN check every chunk decodes as soon as it is compressed
+    """
+    compressor = compression.StreamCompressor(encoding)
+    if encoding == "br":
+        decoder = compression.brotli.Decompressor()
+        decode = decoder.process
+    else:
+        decode = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+    for i in range(3):
+        assert decode(compressor.chunk(b"line %d" % i, last=i == 2)) == b"line %d" % i
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import db
+from services.runtime import LoopLocal
+
+
+@pytest.fixture
+def sqlite_engine(monkeypatch):
+    pytest.importorskip("aiosqlite")
+    monkeypatch.setattr(db, "ASYNC_DATABASE_URL", "sqlite+aiosqlite://")
+    monkeypatch.setattr(
+        db,
+        "POOL_OPTIONS",
+        {**db.POOL_OPTIONS, "poolclass": AsyncAdaptedQueuePool, "pool_pre_ping": False},
+    )
+    monkeypatch.setattr(db, "async_engine", LoopLocal(db._build_async_engine))
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_pool_metrics(sqlite_engine):
+    """
+    WHEN sessions run queries through the async engine
+    THEN check the pool metrics count checkouts and connections return to the pool
+    """
+
+    async def query():
+        async for session in db.get_async_db():
+            await session.execute(text("SELECT 1"))
+
+    async def run():
+        await asyncio.gather(query(), query(), query())
+        await db.close_async_engine()
+
+    checkouts = sample("db_pool_events_total", event="checkout")
+    held = sample("db_pool_connection_held_seconds_count")
+    timeouts = sample("db_pool_events_total", event="timeout")
+    asyncio.run(run())
+    assert sample("db_pool_events_total", event="checkout") == checkouts + 3
+    assert sample("db_pool_connection_held_seconds_count") == held + 3
+    assert sample("db_pool_events_total", event="timeout") == timeouts
+    assert sample("db_pool_checked_out_connections") == 0
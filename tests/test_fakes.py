@@ -0,0 +1,43 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services import geocoding, upstream
+from tests import fakes
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def offline(monkeypatch, shared_store):
+    monkeypatch.setattr(upstream, "client", upstream.client)
+    monkeypatch.setattr(geocoding, "geocode", geocoding.geocode)
+    monkeypatch.setattr(geocoding.gazetteer, "lookup", lambda city: None)
+    return fakes.install(latency=0.05)
+
+
+def test_recorded_payloads(offline):
+    """
+    WHEN the api is called with the offline upstream installed
+    THEN check recorded payloads are served once per city with the injected latency
+    """
+    open_weather, nominatim = offline
+    started = time.perf_counter()
+    response = client.get("/api/v1/forecast/london")
+    assert time.perf_counter() - started >= 0.05
+    assert response.status_code == 200
+    assert len(response.json()) == 40
+
+    assert client.get("/api/v1/forecast/London").status_code == 200
+    assert open_weather.calls["forecast"] == 1
+    assert nominatim.calls == {"london": 1}
+
+
+def test_unknown_city(offline):
+    """
+    WHEN a city is not in the recorded Nominatim results
+    THEN check the api answers 404
+    """
+    assert client.get("/api/v1/current/atlantis").status_code == 404
@@ -0,0 +1,83 @@
+import asyncio
+
+from fastapi import HTTPException
+
+import pytest
+
+from services import fanout
+from services.geocoding import Place
+
+
+@pytest.fixture
+def fake_cities(monkeypatch):
+    state = {"running": 0, "peak": 0, "geocoded": []}
+
+    async def get_city(city):
+        state["geocoded"].append(city)
+        if city == "Atlantis":
+            raise HTTPException(status_code=404, detail=f"Cant find city: {city}")
+        return Place(latitude=1.0, longitude=2.0, raw={"display_name": city})
+
+    async def fetch_weather(lat, lon, units="metric", city_id=None):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        return {"main": {"feels_like": 10.0}}
+
+    monkeypatch.setattr(fanout, "get_city", get_city)
+    monkeypatch.setattr(fanout.upstream, "fetch_weather", fetch_weather)
+    return state
+
+
+def test_duplicates_are_fetched_once(fake_cities):
+    """
+    WHEN a city list repeats names with other case or spacing
+    THEN check every city is geocoded once and order is kept
+    """
+    results = asyncio.run(
+        fanout.cities_weather(["London", "Tokyo", " london", "TOKYO", "Paris"])
+    )
+    assert [i.city for i in results] == ["London", "Tokyo", "Paris"]
+    assert fake_cities["geocoded"] == ["London", "Tokyo", "Paris"]
+
+
+def test_failed_city_is_reported_inline(fake_cities):
+    """
+    WHEN one city of the list can not be found
+    THEN check the others are returned with an error for that city
+    """
+    results = asyncio.run(fanout.cities_weather(["London", "Atlantis"]))
+    assert results[0].weather == {"main": {"feels_like": 10.0}}
+    assert results[1].error == "Cant find city: Atlantis"
+
+
+def test_concurrency_is_capped(fake_cities, monkeypatch):
+    """
+    WHEN more cities than FANOUT_CONCURRENCY are requested
+    THEN check no more than the cap are fetched at the same time
+    """
+    monkeypatch.setattr(fanout.settings, "FANOUT_CONCURRENCY", 3)
+    results = asyncio.run(fanout.cities_weather([f"city {i}" for i in range(10)]))
+    assert len(results) == 10
+    assert fake_cities["peak"] == 3
+
+
+def test_stream_yields_as_resolved(fake_cities, monkeypatch):
+    """
+    WHEN a long city list is streamed and the consumer stops early
+    THEN check results come before the list is done and in-flight cities stop
+    """
+    monkeypatch.setattr(fanout.settings, "FANOUT_CONCURRENCY", 3)
+
+    async def run():
+        stream = fanout.stream_cities_weather([f"city {i}" for i in range(1000)])
+        first = [await stream.__anext__() for _ in range(2)]
+        await stream.aclose()
+        await asyncio.sleep(0.02)
+        return first
+
+    first = asyncio.run(run())
+    assert {i.city for i in first} < {"city 0", "city 1", "city 2"}
+    assert fake_cities["peak"] == 3
+    assert len(fake_cities["geocoded"]) <= 6
@@ -0,0 +1,83 @@
+import os
+import time
+
+import pytest
+
+from services import gazetteer
+
+# name, alternate names, latitude, longitude, feature class, country, population
+ROWS = [
+    ("London", "Londres,Londra", "51.50853", "-0.12574", "P", "GB", "8961989"),
+    ("London", "", "42.98339", "-81.23304", "P", "CA", "422324"),
+    ("Munich", "München,Muenchen", "48.13743", "11.57549", "P", "DE", "1260391"),
+    ("Los Angeles", "LA", "34.05223", "-118.24368", "P", "US", "3898747"),
+    ("United Kingdom", "UK", "54.75844", "-2.69531", "A", "GB", "66488991"),
+]
+
+
+def write_source(source, rows):
+    with open(source, "w", encoding="utf-8") as f:
+        for i, row in enumerate(rows):
+            name, alternates, lat, lon, kind, country, population = row
+            columns = [str(i), name, name, alternates, lat, lon, kind, "", country]
+            columns += ["", "", "", "", "", population, "", "0", "UTC", "2022-11-01"]
+            f.write("\t".join(columns) + "\n")
+
+
+@pytest.fixture
+def index(tmp_path):
+    source = tmp_path / "cities.tsv"
+    write_source(source, ROWS)
+    path = tmp_path / "gazetteer.idx"
+    gazetteer.build(str(source), str(path))
+    index = gazetteer.Gazetteer(str(path))
+    yield index
+    index.close()
+
+
+def test_lookup(index):
+    """
+    WHEN a name, an alternate name or another spelling is looked up
+    THEN check the most populated place with that name is returned
+    """
+    london = index.get("  LONDON ")
+    assert (london.latitude, london.longitude) == (51.50853, -0.12574)
+    assert london.display_name == "London, GB"
+    assert index.get("londres") == london._replace(name="londres")
+    assert index.get("München").display_name == "Munich, DE"
+    assert index.get("muenchen").id == 2
+    assert index.get("atlantis") is None
+    assert index.get("united kingdom") is None
+
+
+def test_prefix(index):
+    """
+    WHEN places are searched by a name prefix
+    THEN check matching places are returned most populated first
+    """
+    assert [i.display_name for i in index.prefix("lo")] == [
+        "London, GB",
+        "Los Angeles, US",
+    ]
+    assert [i.display_name for i in index.prefix("m", limit=1)] == ["Munich, DE"]
+    assert index.prefix("zz") == []
+
+
+def test_rebuild_after_source_edit(tmp_path, monkeypatch):
+    """
+    WHEN the source TSV is edited after the index was built
+    THEN check the next process rebuilds the index from it
+    """
+    source, path = tmp_path / "cities.tsv", tmp_path / "gazetteer.idx"
+    write_source(source, ROWS[:1])
+    gazetteer.build(str(source), str(path))
+    write_source(source, ROWS)
+    later = time.time() + 10
+    os.utime(source, (later, later))
+    monkeypatch.setattr(gazetteer.settings, "GAZETTEER_PATH", str(path))
+    monkeypatch.setattr(gazetteer.settings, "GAZETTEER_SOURCE", str(source))
+    monkeypatch.setattr(gazetteer, "index", None)
+    monkeypatch.setattr(gazetteer, "loaded", False)
+    assert gazetteer.lookup("munich").display_name == "Munich, DE"
+    assert [i.display_name for i in gazetteer.search("lo", 1)] == ["London, GB"]
+    gazetteer.index.close()
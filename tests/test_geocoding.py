@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+import pytest
+
+from services import geocoding
+
+
+@pytest.fixture
+def fake_geocoder(monkeypatch, shared_store):
+    calls = []
+
+    def geocode(query):
+        calls.append(query)
+        if query == "atlantis":
+            return None
+        return SimpleNamespace(
+            latitude=51.5, longitude=-0.12, raw={"display_name": "London, UK"}
+        )
+
+    monkeypatch.setattr(geocoding, "geocode", geocode)
+    monkeypatch.setattr(geocoding.gazetteer, "lookup", lambda city: None)
+    geocoding.places.clear()
+    yield SimpleNamespace(calls=calls, shared=shared_store)
+    geocoding.places.clear()
+
+
+def test_repeat_city_uses_cache(fake_geocoder):
+    """
+    WHEN the same city is geocoded twice with different spelling
+    THEN check Nominatim is called once
+    """
+    first = asyncio.run(geocoding.get_city("London"))
+    second = asyncio.run(geocoding.get_city("  LONDON "))
+    assert first == second
+    assert first.raw["display_name"] == "London, UK"
+    assert fake_geocoder.calls == ["london"]
+
+
+def test_shared_tier_after_restart(fake_geocoder):
+    """
+    WHEN the in-process cache is empty but redis has the city
+    THEN check Nominatim is not called
+    """
+    asyncio.run(geocoding.get_city("London"))
+    geocoding.places.clear()
+    asyncio.run(geocoding.get_city("London"))
+    assert fake_geocoder.calls == ["london"]
+
+
+def test_unknown_city_is_cached(fake_geocoder):
+    """
+    WHEN an unknown city is requested twice
+    THEN check 404 both times and a single Nominatim call
+    """
+    for _ in range(2):
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(geocoding.get_city("Atlantis"))
+        assert e.value.status_code == 404
+    assert fake_geocoder.calls == ["atlantis"]
+    assert fake_geocoder.shared["geocode:atlantis"] is None
@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from main import HEAVY_MODULES, create_app
+
+
+def test_api_profile_has_no_chart_routes():
+    """
+    WHEN the app is built with the api profile
+    THEN check only JSON routers are included
+    """
+    paths = [route.path for route in create_app("api").routes]
+    assert "/api/v1/current/{city}" in paths
+    assert "/users/signup" in paths
+    assert not any(path.startswith("/weather") for path in paths)
+    assert not any(path.startswith("/ops") for path in paths)
+
+
+def test_full_profile_has_chart_routes():
+    """
+    WHEN the app is built with the full profile
+    THEN check chart routes are included
+    """
+    paths = [route.path for route in create_app("full").routes]
+    assert "/weather/forecast/{city}" in paths
+
+
+def imported(profile: str, modules: list) -> str:
+    """
+    Which of modules a fresh worker of the profile imports, other tests
+    load the chart stack into this process
+    """
+    code = "import sys, main; print(sorted(set(sys.modules) & set(sys.argv[1:])))"
+    result = subprocess.run(
+        [sys.executable, "-c", code, *modules],
+        env=dict(os.environ, APP_PROFILE=profile),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+def test_chart_stack_is_lazy():
+    """
+    WHEN the app is imported
+    THEN check numpy/plotly are not loaded
+    """
+    assert imported("full", list(HEAVY_MODULES)) == "[]"
+
+
+def test_api_profile_skips_chart_router():
+    """
+    WHEN a worker starts with the api profile
+    THEN check the chart router and its services are not imported
+    """
+    modules = ["routers.weather", "services.assets", "services.charts"]
+    assert imported("api", modules) == "[]"
+
+
+def test_unknown_profile():
+    """
+    WHEN an unknown profile is requested
+    THEN check it is rejected
+    """
+    with pytest.raises(ValueError):
+        create_app("charts")
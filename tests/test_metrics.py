@@ -0,0 +1,56 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from services import metrics
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_request_metrics():
+    """
+    WHEN a request runs two database statements
+    THEN check latency and statement count are recorded under the route template
+    """
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/items/{id}")
+    async def get_item(id: int):
+        for _ in range(2):
+            conn = type("Connection", (), {"info": {}})()
+            metrics.before_query(conn, None, "SELECT 1", None, None, False)
+            metrics.after_query(conn, None, "SELECT 1", None, None, False)
+        return {"id": id}
+
+    labels = {"method": "GET", "route": "/items/{id}", "status": "200"}
+    before = sample("http_request_duration_seconds_count", **labels)
+    queries = sample("db_queries_per_request_sum", route="/items/{id}")
+
+    client = TestClient(app)
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 200
+    client.get("/missing")
+
+    assert sample("http_request_duration_seconds_count", **labels) == before + 2
+    assert sample("db_queries_per_request_sum", route="/items/{id}") == queries + 4
+    assert sample(
+        "http_request_duration_seconds_count",
+        method="GET",
+        route="unmatched",
+        status="404",
+    )
+
+
+def test_cache_result():
+    """
+    WHEN cache lookups are recorded
+    THEN check they are counted per cache and result
+    """
+    before = sample("cache_lookups_total", cache="test", result="hit")
+    metrics.cache_result("test", "hit")
+    metrics.cache_result("test", "miss")
+    assert sample("cache_lookups_total", cache="test", result="hit") == before + 1
+    assert sample("cache_lookups_total", cache="test", result="miss") >= 1
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from prometheus_client import REGISTRY
+
+from services import passwords
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def fast_context(monkeypatch):
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4)
+    monkeypatch.setattr(passwords, "pwd_context", context)
+    return context
+
+
+def test_hash_and_verify(fast_context):
+    """
+    WHEN a password is hashed in the executor
+    THEN check the right password verifies, a wrong one is counted as rejected
+    """
+    hashes = sample("password_hash_duration_seconds_count", operation="hash")
+    rejected = sample("password_events_total", event="rejected")
+    hashed = asyncio.run(passwords.hash_password("Test_pas5"))
+    assert hashed.startswith("$2b$04$")
+    assert asyncio.run(passwords.verify_password("Test_pas5", hashed)) == (True, None)
+    assert asyncio.run(passwords.verify_password("Wrong_pas5", hashed)) == (
+        False,
+        None,
+    )
+    assert sample("password_hash_duration_seconds_count", operation="hash") == (
+        hashes + 1
+    )
+    assert sample("password_events_total", event="rejected") == rejected + 1
+    assert sample("password_pending_calls") == 0
+
+
+def test_rehash_on_rounds_change(fast_context, monkeypatch):
+    """
+    WHEN BCRYPT_ROUNDS changes after the password was stored
+    THEN check verify returns a new hash with the current rounds
+    """
+    hashed = asyncio.run(passwords.hash_password("Test_pas5"))
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5)
+    monkeypatch.setattr(passwords, "pwd_context", context)
+    valid, new_hash = asyncio.run(passwords.verify_password("Test_pas5", hashed))
+    assert valid
+    assert new_hash.startswith("$2b$05$")
+
+
+def test_queue_full(fast_context, monkeypatch):
+    """
+    WHEN PASSWORD_QUEUE_DEPTH hashing calls are already pending
+    THEN check a new call is rejected with 503
+    """
+    monkeypatch.setattr(passwords, "pending", passwords.settings.PASSWORD_QUEUE_DEPTH)
+    busy = sample("password_events_total", event="busy")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(passwords.hash_password("Test_pas5"))
+    assert error.value.status_code == 503
+    assert sample("password_events_total", event="busy") == busy + 1
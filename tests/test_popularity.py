@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from services import popularity
+from services.geocoding import Place
+
+
+@pytest.fixture
+def fake_redis(fake_redis, monkeypatch):
+    monkeypatch.setattr(popularity, "last_flush", 0.0)
+    monkeypatch.setattr(popularity, "flushing", None)
+    popularity.pending.clear()
+    yield fake_redis
+    popularity.pending.clear()
+
+
+def test_track_batches_counts(fake_redis):
+    """
+    WHEN cities are tracked within one flush interval
+    THEN check counts reach redis in one flush, ranked by lookups
+    """
+
+    async def run():
+        for city in ["London", "paris", " london ", "London", "Paris", "Oslo"]:
+            popularity.track(city)
+        first = popularity.flushing
+        popularity.track("Rome")
+        assert popularity.flushing is first
+        await first
+        return await popularity.top(2)
+
+    assert asyncio.run(run()) == ["london", "paris"]
+    assert fake_redis.scores[popularity.KEY] == {
+        "london": 3,
+        "paris": 2,
+        "oslo": 1,
+        "rome": 1,
+    }
+
+
+def test_decay(fake_redis, monkeypatch):
+    """
+    WHEN counts decay
+    THEN check they are halved, faded and surplus cities are dropped
+    """
+    monkeypatch.setattr(popularity.settings, "POPULAR_MAX_CITIES", 2)
+    fake_redis.scores[popularity.KEY] = {"london": 8, "paris": 4, "oslo": 2, "rome": 1}
+    assert asyncio.run(popularity.decay(0.5)) == 2
+    assert fake_redis.scores[popularity.KEY] == {"london": 4, "paris": 2}
+
+
+def test_warm_refreshes_expiring(fake_redis, shared_store, monkeypatch):
+    """
+    WHEN popular cities are warmed
+    THEN check only payloads close to expiry are refreshed
+    """
+    fake_redis.scores[popularity.KEY] = {"london": 2}
+    ttl = popularity.upstream.CACHE_TTL
+    key = popularity.upstream.cache_key
+    shared_store[key("weather", 51.5, -0.12, "metric")] = {
+        "fetched_at": time.time(),
+        "payload": {},
+    }
+    shared_store[key("forecast", 51.5, -0.12, "metric")] = {
+        "fetched_at": time.time() - ttl["forecast"],
+        "payload": {},
+    }
+    refreshed = []
+
+    async def get_city(city):
+        return Place(51.5, -0.12, {"display_name": "London"})
+
+    async def refresh(key, endpoint, lat, lon, units, city_id):
+        refreshed.append(endpoint)
+
+    monkeypatch.setattr(popularity, "get_city", get_city)
+    monkeypatch.setattr(popularity.upstream, "refresh", refresh)
+    result = asyncio.run(popularity.warm())
+    assert result == {"cities": 1, "refreshed": 2}
+    assert refreshed == ["forecast", "air_pollution/forecast"]
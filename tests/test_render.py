@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from fastapi import HTTPException
+
+import pytest
+
+from services import render
+
+
+def add(a, b):
+    return a + b
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+@pytest.fixture(autouse=True)
+def render_pool():
+    yield
+    render.shutdown()
+
+
+def test_render_in_pool():
+    """
+    WHEN a builder is rendered
+    THEN check its result comes back from the pool
+    """
+    assert asyncio.run(render.render(add, 2, 3)) == 5
+    assert render.pending == 0
+
+
+def wait_released(seconds=10.0):
+    deadline = time.monotonic() + seconds
+    while render.pending and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return render.pending == 0
+
+
+def test_render_timeout_keeps_slot(monkeypatch):
+    """
+    WHEN a render takes longer than RENDER_TIMEOUT
+    THEN check 504 is raised and the slot is held until the job finishes
+    """
+    asyncio.run(render.render(add, 1, 1))
+    monkeypatch.setattr(render.settings, "RENDER_TIMEOUT", 0.1)
+    monkeypatch.setattr(render, "recycle", lambda: None)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(render.render(sleep, 1))
+    assert e.value.status_code == 504
+    assert render.pending == 1
+    assert wait_released()
+
+
+def test_render_timeout_recycles_pool(monkeypatch):
+    """
+    WHEN a render hangs past RENDER_TIMEOUT
+    THEN check its worker is stopped, the slot released and the next render works
+    """
+    asyncio.run(render.render(add, 1, 1))
+    hung = render.executor
+    monkeypatch.setattr(render.settings, "RENDER_TIMEOUT", 0.1)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(render.render(sleep, 60))
+    assert e.value.status_code == 504
+    assert wait_released()
+    monkeypatch.setattr(render.settings, "RENDER_TIMEOUT", 30)
+    assert asyncio.run(render.render(add, 2, 3)) == 5
+    assert render.executor is not hung
+
+
+def test_render_queue_full(monkeypatch):
+    """
+    WHEN RENDER_QUEUE_DEPTH renders are pending
+    THEN check new renders are rejected with 503
+    """
+    monkeypatch.setattr(render, "pending", render.settings.RENDER_QUEUE_DEPTH)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(render.render(add, 2, 3))
+    assert e.value.status_code == 503
+
+
+def test_pool_processes_without_internals():
+    """
+    WHEN the pool has no _processes attribute or it was cleared
+    THEN check no worker is returned instead of failing the recycle
+    """
+    assert render.pool_processes(object()) == []
+    pool = render.ProcessPoolExecutor(max_workers=1)
+    pool._processes = None
+    assert render.pool_processes(pool) == []
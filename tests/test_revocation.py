@@ -0,0 +1,109 @@
+import asyncio
+import importlib.util
+import os
+import time
+
+import jwt
+import pytest
+import sqlalchemy as sa
+
+from services import revocation
+
+
+@pytest.fixture
+def fake_redis(fake_redis, monkeypatch):
+    monkeypatch.setattr(revocation, "bloom", revocation.new_filter())
+    monkeypatch.setattr(revocation, "bloom_ready", True)
+    return fake_redis
+
+
+def test_bloom_filter():
+    """
+    WHEN fingerprints are added to the filter
+    THEN check they are found and others are not
+    """
+    bloom = revocation.BloomFilter(2 ** 16, 7)
+    added = [revocation.fingerprint(f"token-{i}") for i in range(100)]
+    for i in added:
+        bloom.add(i)
+    assert all(i in bloom for i in added)
+    others = [revocation.fingerprint(f"other-{i}") for i in range(1000)]
+    assert sum(i in bloom for i in others) < 10
+
+
+def test_revoke_until_expiry(fake_redis):
+    """
+    WHEN a token is revoked
+    THEN check it is stored until its expiry and announced to other workers
+    """
+    asyncio.run(revocation.revoke("token", time.time() + 600))
+    key = revocation.fingerprint("token")
+    assert 599 <= fake_redis.ttls[f"revoked:{key}"] <= 601
+    assert fake_redis.published == [("revoked", key)]
+    assert asyncio.run(revocation.is_revoked("token"))
+
+
+def test_not_revoked_skips_redis(fake_redis):
+    """
+    WHEN a token missing from the bloom filter is checked
+    THEN check redis is not queried
+    """
+    assert not asyncio.run(revocation.is_revoked("token"))
+    assert fake_redis.calls["exists"] == 0
+
+
+def test_expired_token_is_not_stored(fake_redis):
+    """
+    WHEN an already expired token is revoked
+    THEN check nothing is stored
+    """
+    asyncio.run(revocation.revoke("token", time.time() - 10))
+    assert fake_redis.keys == {}
+
+
+def load_migration(name: str):
+    path = os.path.join(os.path.dirname(__file__), "..", "alembic", "versions", name)
+    spec = importlib.util.spec_from_file_location(name[:-3], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_blacklist_migration_keeps_revocations():
+    """
+    WHEN the blacklist table is migrated to redis
+    THEN check unexpired tokens stay revoked for their remaining lifetime
+    """
+    migration = load_migration("3b9f1c2d7a4e_drop_blacklist.py")
+
+    class FakePipeline:
+        def __init__(self):
+            self.keys = {}
+            self.published = []
+
+        def set(self, key, value, ex=None):
+            self.keys[key] = ex
+
+        def publish(self, channel, message):
+            self.published.append((channel, message))
+
+        def execute(self):
+            pass
+
+    pipe = FakePipeline()
+    client = type("Redis", (), {"pipeline": lambda self, transaction: pipe})()
+    live = jwt.encode({"expires": time.time() + 300}, "secret", algorithm="HS256")
+    expired = jwt.encode({"expires": time.time() - 1}, "secret", algorithm="HS256")
+    engine = sa.create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(sa.text("CREATE TABLE blacklist (token VARCHAR)"))
+        for token in (live, expired, b"not a token"):
+            connection.execute(
+                sa.text("INSERT INTO blacklist VALUES (:token)"),
+                {"token": token.decode()},
+            )
+        copied = migration.copy_revocations(connection, client, "secret", "HS256")
+    key = revocation.fingerprint(live.decode())
+    assert copied == 1
+    assert 299 <= pipe.keys[f"revoked:{key}"] <= 301
+    assert pipe.published == [(revocation.CHANNEL, key)]
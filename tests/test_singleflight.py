@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_result():
+    """
+    WHEN the same key is requested concurrently
+    THEN check the function runs once and everyone gets its result
+    """
+    calls = []
+
+    async def lookup(city):
+        calls.append(city)
+        await asyncio.sleep(0.01)
+        return city.upper()
+
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(
+            *(flights.do("london", lookup, "london") for _ in range(10))
+        )
+        assert "london" not in flights
+        again = await flights.do("london", lookup, "london")
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert results == ["LONDON"] * 10
+    assert again == "LONDON"
+    assert calls == ["london", "london"]
+
+
+def test_concurrent_calls_share_exception():
+    """
+    WHEN the shared call fails
+    THEN check every caller gets the exception
+    """
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def main():
+        flights = SingleFlight()
+        return await asyncio.gather(
+            *(flights.do("key", lookup) for _ in range(5)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(i, ValueError) for i in results)
+    assert calls == [1]
+
+
+def test_cancelled_caller_keeps_call_running():
+    """
+    WHEN one of the callers is cancelled
+    THEN check the others still get the result
+    """
+
+    async def lookup():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    async def main():
+        flights = SingleFlight()
+        first = asyncio.ensure_future(flights.do("key", lookup))
+        second = asyncio.ensure_future(flights.do("key", lookup))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "ok"
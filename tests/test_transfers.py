@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError
+
+from services import transfers
+
+
+def test_transfer_is_stored_until_expiry(fake_redis):
+    """
+    WHEN a transfer of many items is created
+    THEN check only a short id is returned, the items expire with the link
+    and are handed out once
+    """
+    items = list(range(1000))
+    transfer_id = asyncio.run(transfers.create(7, items))
+    assert len(transfer_id) < 32
+    assert fake_redis.ttls[f"transfer:{transfer_id}"] == transfers.settings.TRANSFER_TTL
+    assert asyncio.run(transfers.take(transfer_id)) == {"sender": 7, "items": items}
+    assert asyncio.run(transfers.take(transfer_id)) is None
+    assert asyncio.run(transfers.take("unknown")) is None
+
+
+def test_store_unavailable(monkeypatch):
+    """
+    WHEN redis is down
+    THEN check 503 instead of a dead link
+    """
+
+    class DownRedis:
+        async def set(self, *args, **kwargs):
+            raise ConnectionError("down")
+
+    monkeypatch.setattr(transfers.store, "get_redis", lambda: DownRedis())
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(transfers.create(7, [1]))
+    assert e.value.status_code == 503
@@ -0,0 +1,209 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from functools import partial
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from services import upstream
+from services.runtime import LoopLocal
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch, shared_store):
+    calls = []
+
+    async def fetch(endpoint, **params):
+        calls.append((endpoint, params))
+        if endpoint == "group":
+            ids = [int(i) for i in params["id"].split(",") if i != "404"]
+            return {"list": [{"id": i, "call": len(calls)} for i in ids]}
+        return {"endpoint": endpoint, "call": len(calls)}
+
+    monkeypatch.setattr(upstream, "fetch", fetch)
+    upstream.responses.clear()
+    yield SimpleNamespace(calls=calls, shared=shared_store)
+    upstream.responses.clear()
+
+
+def mock_client(monkeypatch, handler):
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(
+        upstream, "client", LoopLocal(partial(upstream._build_client, transport))
+    )
+
+
+def bad_gateway(request):
+    return httpx.Response(503, json={"message": "busy"})
+
+
+def refused(request):
+    raise httpx.ConnectError("Connection refused", request=request)
+
+
+def timed_out(request):
+    raise httpx.ReadTimeout("Read timed out", request=request)
+
+
+@pytest.mark.parametrize(
+    "handler, status_code, detail",
+    [
+        (bad_gateway, 502, "OpenWeather error: 503"),
+        (refused, 502, "OpenWeather unavailable"),
+        (timed_out, 504, "OpenWeather timeout"),
+    ],
+)
+def test_fetch_errors(monkeypatch, handler, status_code, detail):
+    """
+    WHEN OpenWeather answers with an error status, refuses or times out
+    THEN check fetch raises 502 for errors and 504 for timeouts
+    """
+    mock_client(monkeypatch, handler)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(upstream.fetch("weather", lat=51.5, lon=-0.1))
+    assert error.value.status_code == status_code
+    assert error.value.detail == detail
+
+
+def test_fetch_sends_key_and_params(monkeypatch):
+    """
+    WHEN OpenWeather answers 200
+    THEN check the payload is returned and the api key is sent with the params
+    """
+    requests = []
+
+    def ok(request):
+        requests.append(request)
+        return httpx.Response(200, json={"name": "London"})
+
+    mock_client(monkeypatch, ok)
+    payload = asyncio.run(upstream.fetch("weather", lat=51.5, lon=-0.1))
+    assert payload == {"name": "London"}
+    assert requests[0].url.path.endswith("/weather")
+    assert requests[0].url.params["lat"] == "51.5"
+    assert requests[0].url.params["appid"] == upstream.settings.OPEN_WEATHER_KEY
+
+
+def test_fresh_payload_is_cached(fake_upstream):
+    """
+    WHEN nearby coordinates are fetched twice
+    THEN check one upstream call with rounded coordinates
+    """
+    first = asyncio.run(upstream.fetch_weather(51.50735, -0.12776))
+    second = asyncio.run(upstream.fetch_weather(51.5071, -0.1281))
+    assert first == second
+    assert fake_upstream.calls == [
+        ("weather", {"lat": 51.51, "lon": -0.13, "units": "metric"})
+    ]
+
+
+def test_units_and_endpoints_are_separate(fake_upstream):
+    """
+    WHEN the same place is fetched with other units or endpoint
+    THEN check every combination hits upstream once
+    """
+    asyncio.run(upstream.fetch_weather(51.5, -0.1))
+    asyncio.run(upstream.fetch_weather(51.5, -0.1, "imperial"))
+    asyncio.run(upstream.fetch_forecast(51.5, -0.1))
+    asyncio.run(upstream.fetch_pollution(51.5, -0.1))
+    assert len(fake_upstream.calls) == 4
+
+
+def test_stale_payload_is_revalidated(fake_upstream):
+    """
+    WHEN a cached payload is past its ttl but within the stale window
+    THEN check the stale payload is returned and refreshed in background
+    """
+    key = upstream.cache_key("weather", 51.5, -0.1, "metric")
+    fetched_at = time.time() - upstream.CACHE_TTL["weather"] - 1
+    fake_upstream.shared[key] = {"fetched_at": fetched_at, "payload": {"call": 0}}
+
+    async def request():
+        payload = await upstream.fetch_weather(51.5, -0.1)
+        await asyncio.gather(*upstream.refreshing.values())
+        return payload
+
+    assert asyncio.run(request()) == {"call": 0}
+    assert len(fake_upstream.calls) == 1
+    assert fake_upstream.shared[key]["payload"]["call"] == 1
+    assert asyncio.run(upstream.fetch_weather(51.5, -0.1))["call"] == 1
+
+
+def test_city_ids_are_batched(fake_upstream):
+    """
+    WHEN current weather of several cities with a city id misses concurrently
+    THEN check one group call, unknown ids are fetched by coordinates
+    """
+
+    async def request():
+        return await asyncio.gather(
+            upstream.fetch_weather(51.5, -0.1, city_id=2643743),
+            upstream.fetch_weather(48.9, 2.3, city_id=2988507),
+            upstream.fetch_weather(1.0, 2.0, city_id=404),
+            upstream.fetch_weather(3.0, 4.0),
+        )
+
+    london, paris, unknown, other = asyncio.run(request())
+    assert london == {"id": 2643743, "call": 2}
+    assert paris["id"] == 2988507
+    assert [endpoint for endpoint, _ in fake_upstream.calls] == [
+        "weather",
+        "group",
+        "weather",
+    ]
+    assert fake_upstream.calls[1][1] == {
+        "id": "2643743,2988507,404",
+        "units": "metric",
+    }
+    assert asyncio.run(upstream.fetch_weather(51.5, -0.1)) == london
+
+
+def test_failed_group_falls_back_to_coordinates(monkeypatch, shared_store):
+    """
+    WHEN the group call of a batch fails upstream
+    THEN check every city of the batch is fetched by coordinates instead
+    """
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path.rsplit("/", 1)[-1])
+        if request.url.path.endswith("/group"):
+            return httpx.Response(502, json={"message": "bad gateway"})
+        return httpx.Response(200, json={"lat": request.url.params["lat"]})
+
+    async def request():
+        return await asyncio.gather(
+            upstream.fetch_weather(51.5, -0.1, city_id=2643743),
+            upstream.fetch_weather(48.9, 2.3, city_id=2988507),
+        )
+
+    mock_client(monkeypatch, handler)
+    upstream.responses.clear()
+    try:
+        london, paris = asyncio.run(request())
+    finally:
+        upstream.responses.clear()
+    assert london == {"lat": "51.5"}
+    assert paris == {"lat": "48.9"}
+    assert sorted(paths) == ["group", "weather", "weather"]
+
+
+def test_group_batch_size_is_capped():
+    """
+    WHEN GROUP_BATCH_SIZE is set above the OpenWeather group limit
+    THEN check group calls carry at most 20 ids
+    """
+    code = "from services import upstream; print(upstream.groups.size)"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=dict(os.environ, GROUP_BATCH_SIZE="50"),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip().splitlines()[-1] == "20"
@@ -119,7 +119,6 @@ def test_logout(get_token, get_user):
     assert response.status_code == 204
 
     with engine.connect().execution_options(autocommit=True) as conn:
-        conn.exec_driver_sql("DELETE FROM blacklist WHERE token=(%(val)s)",[{"val": token}])
         conn.exec_driver_sql("DELETE FROM users WHERE login=(%(val)s)", [{"val": get_user["login"]}])
 
 
@@ -139,7 +138,221 @@ def test_blacklist(user_signup):
 
     with engine.connect().execution_options(autocommit=True) as conn:
         conn.exec_driver_sql("DELETE FROM users WHERE login=(%(val)s)", [{"val": "user_test@example.com"}])
-        conn.exec_driver_sql("DELETE FROM blacklist WHERE token=(%(val)s)", [{"val": token}])
 
 
 
+
+
+def test_items_pages(get_token):
+    """
+    WHEN "users/items" GET with limit and cursor
+    and "users/items/export" GET
+    THEN check pages follow each other and export returns all items
+    """
+    token = get_token
+    for title in ("page_1", "page_2", "page_3"):
+        client.post("users/items/new", headers={"token": token}, json={"title": title})
+
+    first = client.get("users/items?limit=2", headers={"token": token}).json()
+    assert [i["title"] for i in first["items"]] == ["page_1", "page_2"]
+    assert first["next_cursor"] == first["items"][-1]["id"]
+
+    second = client.get(
+        f"users/items?limit=2&cursor={first['next_cursor']}", headers={"token": token}
+    ).json()
+    assert [i["title"] for i in second["items"]] == ["page_3"]
+    assert second["next_cursor"] is None
+
+    export = client.get("users/items/export", headers={"token": token})
+    assert export.status_code == 200
+    assert [i["title"] for i in export.json()["items"]] == ["page_1", "page_2", "page_3"]
+
+    with engine.connect().execution_options(autocommit=True) as conn:
+        conn.exec_driver_sql("DELETE FROM items WHERE title LIKE 'page_%%'")
+        conn.exec_driver_sql("DELETE FROM users WHERE login=(%(val)s)", [{"val": "user_test@example.com"}])
+
+
+def test_items_bulk(get_token):
+    """
+    WHEN "users/items/bulk" POST and "users/items/bulk/delete" POST
+    THEN check items are created once and deleted with per item results
+    """
+    token = get_token
+    response = client.post(
+        "users/items/bulk", headers={"token": token}, json={"titles": ["bulk_1", "bulk_2", "bulk_1"]}
+    )
+    assert response.status_code == 201
+    created = response.json()
+    assert [i["status"] for i in created] == ["created", "created"]
+
+    response = client.post(
+        "users/items/bulk", headers={"token": token}, json={"titles": ["bulk_1"]}
+    )
+    assert response.json()[0]["status"] == "exists"
+
+    ids = [i["id"] for i in created]
+    response = client.post(
+        "users/items/bulk/delete", headers={"token": token}, json={"ids": ids + [0]}
+    )
+    assert response.status_code == 200
+    assert [i["status"] for i in response.json()] == ["deleted", "deleted", "not_found"]
+
+    with engine.connect().execution_options(autocommit=True) as conn:
+        conn.exec_driver_sql("DELETE FROM users WHERE login=(%(val)s)", [{"val": "user_test@example.com"}])
+
+
+"""Transfer TEST"""
+
+OTHER_USER = {"login": "user_test_2@example.com", "password": "Test_pas5"}
+
+
+@pytest.fixture
+def get_other_token():
+    response = client.post("users/signup", json=OTHER_USER)
+    return response.json()["access_token"]
+
+
+@pytest.fixture
+def cleanup_users(get_user):
+    yield
+    logins = [get_user["login"], OTHER_USER["login"]]
+    with engine.connect().execution_options(autocommit=True) as conn:
+        for login in logins:
+            conn.exec_driver_sql(
+                "DELETE FROM items WHERE user_id IN (SELECT id FROM users WHERE login=(%(val)s))",
+                [{"val": login}],
+            )
+            conn.exec_driver_sql("DELETE FROM users WHERE login=(%(val)s)", [{"val": login}])
+
+
+def link_path(url):
+    # Links are built on BACKEND_URL, the users router is mounted at /users
+    return "users" + url[len(settings.BACKEND_URL):]
+
+
+def create_items(token, titles):
+    response = client.post("users/items/bulk", headers={"token": token}, json={"titles": titles})
+    return [i["id"] for i in response.json()]
+
+
+def item_titles(token):
+    response = client.get("users/items", headers={"token": token})
+    return [i["title"] for i in response.json()["items"]]
+
+
+def test_items_bulk_transfer(get_token, get_other_token, cleanup_users):
+    """
+    WHEN "users/send/bulk" POST and the link is opened by the recipient twice
+    THEN check owned items move once and the replay is not found
+    """
+    token, other_token = get_token, get_other_token
+    ids = create_items(token, ["send_1", "send_2"])
+    response = client.post(
+        "users/send/bulk",
+        headers={"token": token},
+        json={"user_login": OTHER_USER["login"], "item_ids": ids + [0]},
+    )
+    assert response.status_code == 201
+    body = response.json()
+    assert [i["status"] for i in body["items"]] == ["ready", "ready", "not_found"]
+    assert len(body["url"]) < 1024
+
+    path = link_path(body["url"])
+    response = client.get(path, headers={"token": token})
+    assert response.status_code == 400
+
+    response = client.get(path, headers={"token": other_token})
+    assert response.status_code == 200
+    assert [i["status"] for i in response.json()] == ["moved", "moved"]
+    assert item_titles(other_token) == ["send_1", "send_2"]
+    assert item_titles(token) == []
+
+    response = client.get(path, headers={"token": other_token})
+    assert response.status_code == 404
+
+
+def test_transfer_replay(get_user, get_token, get_other_token, cleanup_users):
+    """
+    WHEN a transfer link is opened again after the items went back to the sender
+    THEN check the replay is not found and the items stay with the sender
+    """
+    token, other_token = get_token, get_other_token
+    item_id = create_items(token, ["replay"])[0]
+    url = client.post(
+        "users/send",
+        headers={"token": token},
+        json={"user_login": OTHER_USER["login"], "item_id": item_id},
+    ).json()
+    path = link_path(url)
+    bulk_id = create_items(token, ["bulk_replay"])[0]
+    bulk_path = link_path(
+        client.post(
+            "users/send/bulk",
+            headers={"token": token},
+            json={"user_login": OTHER_USER["login"], "item_ids": [bulk_id]},
+        ).json()["url"]
+    )
+    assert client.get(path, headers={"token": other_token}).status_code == 200
+    assert client.get(bulk_path, headers={"token": other_token}).status_code == 200
+    assert item_titles(other_token) == ["replay", "bulk_replay"]
+
+    back = client.post(
+        "users/send/bulk",
+        headers={"token": other_token},
+        json={"user_login": get_user["login"], "item_ids": [item_id, bulk_id]},
+    ).json()["url"]
+    assert client.get(link_path(back), headers={"token": token}).status_code == 200
+    assert client.get(path, headers={"token": other_token}).status_code == 404
+    assert client.get(bulk_path, headers={"token": other_token}).status_code == 404
+    assert item_titles(token) == ["replay", "bulk_replay"]
+    assert item_titles(other_token) == []
+
+
+def test_transfer_not_owned(get_token, get_other_token, cleanup_users):
+    """
+    WHEN a user sends items of another user, or an item it gave away after sending
+    THEN check nothing is transferred
+    """
+    token, other_token = get_token, get_other_token
+    other_id = create_items(other_token, ["not_mine"])[0]
+    response = client.post(
+        "users/send",
+        headers={"token": token},
+        json={"user_login": OTHER_USER["login"], "item_id": other_id},
+    )
+    assert response.status_code == 400
+    response = client.post(
+        "users/send/bulk",
+        headers={"token": token},
+        json={"user_login": OTHER_USER["login"], "item_ids": [other_id]},
+    )
+    assert [i["status"] for i in response.json()["items"]] == ["not_found"]
+
+    # A link stays valid only while the sender still owns the item
+    item_id = create_items(token, ["given_away"])[0]
+    url = client.post(
+        "users/send",
+        headers={"token": token},
+        json={"user_login": OTHER_USER["login"], "item_id": item_id},
+    ).json()
+    client.delete(f"users/items/{item_id}", headers={"token": token})
+    assert client.get(link_path(url), headers={"token": other_token}).status_code == 400
+    assert item_titles(other_token) == ["not_mine"]
+
+
+def test_delete_not_owned(get_token, get_other_token, cleanup_users):
+    """
+    WHEN a user deletes items of another user, alone or in a bulk delete
+    THEN check they are kept and reported as not found
+    """
+    token, other_token = get_token, get_other_token
+    own_id = create_items(token, ["own"])[0]
+    other_id = create_items(other_token, ["other"])[0]
+    response = client.delete(f"users/items/{other_id}", headers={"token": token})
+    assert response.status_code == 400
+    response = client.post(
+        "users/items/bulk/delete", headers={"token": token}, json={"ids": [own_id, other_id]}
+    )
+    assert [i["status"] for i in response.json()] == ["deleted", "not_found"]
+    assert item_titles(token) == []
+    assert item_titles(other_token) == ["other"]
@@ -5,6 +5,8 @@ from fastapi.testclient import TestClient
 import pytest
 
 from main import app
+from services import assets, compression
+from services.assets import PLOTLY_JS_URL
 from settings import Settings
 
 settings = Settings()
@@ -80,3 +82,56 @@ def test_pollution_forecast(city):
     response = client.get(f"/weather/pollution/forecast/{city}")
     assert response.status_code == 200
 
+
+@pytest.mark.parametrize("city", test_data_cities)
+def test_forecast_figure_json(city):
+    """
+    WHEN GET "/weather/forecast/{city}?format=json" requested
+    THEN check that plotly figure json is returned
+    """
+    response = client.get(f"/weather/forecast/{city}", params={"format": "json"})
+    assert response.status_code == 200
+    assert "data" in response.json()
+
+
+def test_plotly_js_static():
+    """
+    WHEN GET plotly.js bundle requested
+    THEN check it is served with a long cache lifetime
+    """
+    response = client.get(PLOTLY_JS_URL)
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+
+
+def test_chart_is_precompressed():
+    """
+    WHEN a chart is requested with and without gzip
+    THEN check the precompressed variant has its own ETag and same content
+    """
+    plain = client.get("/weather/forecast/london", headers={"accept-encoding": ""})
+    response = client.get(
+        "/weather/forecast/london", headers={"accept-encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("text/html")
+    assert response.headers["etag"] != plain.headers["etag"]
+    assert int(response.headers["content-length"]) < len(plain.content) / 3
+    assert response.text == plain.text
+
+
+def test_plotly_js_precompressed(tmp_path, monkeypatch):
+    """
+    WHEN the plotly.js bundle is requested with gzip after precompression
+    THEN check the stored variant is served with its own ETag
+    """
+    monkeypatch.setattr(assets.settings, "ASSET_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(compression.settings, "BROTLI_STATIC_QUALITY", 1)
+    plain = client.get(PLOTLY_JS_URL, headers={"accept-encoding": ""})
+    assets.precompress()
+    response = client.get(PLOTLY_JS_URL, headers={"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] != plain.headers["etag"]
+    assert "javascript" in response.headers["content-type"]
+    assert int(response.headers["content-length"]) < len(plain.content) / 3
+    assert response.content == plain.content
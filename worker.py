@@ -1,9 +1,10 @@
+import asyncio
+
 from celery import Celery 
 from celery.schedules import crontab
 
-import os
 from settings import Settings
-from db import engine
+from services import artifacts, popularity, store, upstream
 
 settings = Settings()
 
@@ -14,23 +15,43 @@ logger = celery.log.get_default_logger()
 @celery.task
 def clear_stats():
     """
-    Delete files from stats folder
+    Evict expired and least recently used charts from stats folder
+    """
+    logger.info("Start task evict stats")
+    deleted = artifacts.evict()
+    logger.info(f"End task evict stats, deleted: {deleted}")
+    return True
+
+
+async def with_clients(job):
+    """
+    Run a job in a fresh event loop, close its http and redis clients after
     """
-    logger.info("Start task delete stats")
-    os.system("rm stats/*")
-    logger.info("End task delete stats")
-    return True 
+    try:
+        return await job
+    finally:
+        await upstream.close_client()
+        await store.close_redis()
 
 
 @celery.task
-def delete_blacklist():
+def warm_popular():
     """
-    Delete all tokens from blacklist
+    Refresh weather payloads of the most requested cities before they expire
     """
-    logger.info("Start delete tokens from blacklist")
-    with engine.connect().execution_options(autocommit=True) as conn:
-        conn.exec_driver_sql("DELETE FROM blacklist")
-    logger.info("Done delete tokens from blacklist")
+    result = asyncio.run(with_clients(popularity.warm()))
+    logger.info(f"Warm popular cities: {result}")
+    return result
+
+
+@celery.task
+def decay_popular():
+    """
+    Halve city lookup counts so old traffic fades out
+    """
+    kept = asyncio.run(with_clients(popularity.decay(0.5)))
+    logger.info(f"Decay popular cities, kept: {kept}")
+    return kept
 
 
 celery.conf.beat_schedule = {
@@ -38,8 +59,12 @@ celery.conf.beat_schedule = {
         "task": "worker.clear_stats",
         "schedule": crontab(minute="*/1"),
     },
-    "every-2-minute": {
-        "task": "worker.delete_blacklist",
-        "schedule": crontab(minute=0, hour=0),
+    "warm-popular": {
+        "task": "worker.warm_popular",
+        "schedule": settings.WARM_INTERVAL,
+    },
+    "decay-popular": {
+        "task": "worker.decay_popular",
+        "schedule": settings.POPULAR_HALF_LIFE,
     },
 }